@@ -4,91 +4,24 @@ import os
 import torch
 import pickle
 from torch.utils.data.dataset import Dataset
-from transform import default_val_transforms
+from torch.utils.data.sampler import Sampler
+from transform import default_val_transforms, CachedTransformation
 from scipy import sparse
+from store import CoordinateStore
+from store.reader import load as load_pickle
+# inverse-distance weighted edge sampling without replacement in one vectorized pass (exponential race)
+from tsp.sampling import edge_sampler, sample_size
+
+try:
+    from torch_geometric.data import Data
+except ImportError:
+    # only the graph datasets need torch_geometric
+    Data = None
 
 '''
-from torch_geometric.data import Dataset as GeoDataset
-from torch_geometric.data import Data
-from torch_geometric.utils.convert import from_scipy_sparse_matrix
 from hilbertcurve.hilbertcurve import HilbertCurve
 from sklearn.decomposition import PCA
-
-def edge_sampler(edge_index, edge_attr, prob = 0.5):
-    edge_num = edge_attr.shape[0]
-    p = 1.0 / edge_attr
-    p = p / np.sum(p)
-    sample_size = int(edge_num * prob)
-    idx = np.random.choice(edge_num, size= sample_size, replace = False, p = p)
-    edge_attr = edge_attr[idx]
-    # edge attribute normalization
-    #edge_attr = edge_attr / np.sum(edge_attr)
-    return edge_index[:, idx], edge_attr
-
-
-class GeoInstanceDataset(GeoDataset):
-    def __init__(self, num_node_feats, path, labels):
-        """
-        path: the  directory of the input of instances (edges and weight matrix)
-        labels: dictionary of instance -> label
-        """
-        self.num_node_feats = num_node_feats
-        self.path = path
-        self.labels = labels
-        self.file_list = []
-        self.label_map = {'eax': 0,
-                          'eax.restart': 1,
-                          'lkh': 2,
-                          'lkh.restart': 3,
-                          'maos': 4}
-        for key in labels.keys():
-            dataset = key.strip().split('_')[0]
-            instance_id = key.strip().split('_')[1]
-            if dataset == 'morphed':
-                node_num = instance_id.strip().split('-')[0]
-                tmp1, tmp2 = instance_id.strip().split('---')[0], instance_id.strip().split('---')[1]
-                instance_id = node_num + "---" + tmp1 + '.tsp---' + tmp2 + '.tsp'
-            #full_instance_dir = os.path.join(path, dataset, instance_id) + '.pickle'
-            # load the normalized tsp problem
-            full_instance_dir = os.path.join(path, dataset, instance_id) + '_norm.pickle'
-            self.file_list.append((key, full_instance_dir))
-        self.num = len(self.file_list)
-
-    def __getitem__(self, index):
-        key, full_instance_dir = self.file_list[index]
-        with open(full_instance_dir, 'rb') as in_file:
-            data = pickle.load(in_file)
-            x, edge_index, edge_attr = data['x'], data['edge_index'], data['edge_attr']
-            # x : (N, 2)
-
-            edge_index, edge_attr = edge_sampler(edge_index, edge_attr)
-
-            # TODO: normalize x
-
-            #x = x / x.max(axis = 0)
-            #x = torch.zeros((x.shape[0], self.num_node_feats), dtype=torch.float)
-
-            label = np.zeros(shape = (1), dtype = np.int)
-            idx = self.label_map[self.labels[key]]
-            label[0] = idx
-            label = torch.LongTensor(label)
-            x = torch.FloatTensor(x)
-            edge_index = torch.LongTensor(edge_index)
-            edge_attr = torch.FloatTensor(edge_attr)
-
-            #print(x.shape, edge_index.shape, edge_attr.shape)
-            data = Data(x = x, edge_index = edge_index, edge_attr = edge_attr, y = label)
-            return data
-
-    def __len__(self):
-        return self.num
-
-    def _download(self):
-        pass
-
-    def _process(self):
-        pass
-
+from util import load_norm_instance
 
 
 class InstanceDataset(Dataset):
@@ -114,36 +47,36 @@ class InstanceDataset(Dataset):
                 tmp1, tmp2 = instance_id.strip().split('---')[0], instance_id.strip().split('---')[1]
                 instance_id = node_num + "---" + tmp1 + '.tsp---' + tmp2 + '.tsp'
             #full_instance_dir = os.path.join(path, dataset, instance_id) + '.pickle'
-            # load the normalized tsp problem
-            full_instance_dir = os.path.join(path, dataset, instance_id) + '_norm.pickle'
+            # the normalized tsp problem of util.load_tsp_instance, read by util.load_norm_instance
+            full_instance_dir = os.path.join(path, dataset, instance_id) + '.tsp'
             self.file_list.append((key, full_instance_dir))
         self.num = len(self.file_list)
 
     def __getitem__(self, index):
         key, full_instance_dir = self.file_list[index]
-        with open(full_instance_dir, 'rb') as in_file:
-            data = pickle.load(in_file)
-            A = data['adj'] # A： （N, N） distance matrix
-            x = data['x']
-            A = self.hilbert_matrix_reorder(x,  A)
-
-            label = np.zeros(shape = (1), dtype = np.int)
-            idx = self.label_map[self.labels[key]]
-            label[0] = idx
-            label = torch.LongTensor(label)
-            A = torch.FloatTensor(A)
-            #padding to fixed size
-            image = self.padding(A)
-            #image = self.toTSPImage(x)
+        data = load_norm_instance(full_instance_dir)
+        # the reorder is in place, copy out of the read-only memory map
+        A = np.array(data['adj']) # A： （N, N） distance matrix
+        x = data['x']
+        A = self.hilbert_matrix_reorder(x,  A)
+
+        label = np.zeros(shape = (1), dtype = np.int64)
+        idx = self.label_map[self.labels[key]]
+        label[0] = idx
+        label = torch.LongTensor(label)
+        A = torch.FloatTensor(A)
+        #padding to fixed size
+        image = self.padding(A)
+        #image = self.toTSPImage(x)
 
-            # repeat to 3 channels
-            # image = image.repeat(1, 3)
-            # image = image.view((3, image.shape[0], image.shape[0]))
+        # repeat to 3 channels
+        # image = image.repeat(1, 3)
+        # image = image.view((3, image.shape[0], image.shape[0]))
 
-            # for 1 channel
-            image = image.view((1, image.shape[0], image.shape[0]))
-            #print(image.shape)
-            return image, label
+        # for 1 channel
+        image = image.view((1, image.shape[0], image.shape[0]))
+        #print(image.shape)
+        return image, label
 
     def padding(self, A):
         delta_width = 2000 - A.shape[0]
@@ -202,12 +135,14 @@ class InstanceDataset(Dataset):
 Dataset of TSP image with image rotation and flip data argumentation
 '''
 class AugmentInstanceDataset(Dataset):
-    def __init__(self, num_node_feats, path, labels):
+    def __init__(self, num_node_feats, path, labels, in_channels = 3):
         """
         path: the  directory of the input of instances (edges and weight matrix)
         labels: dictionary of instance -> label
+        in_channels: 3 to repeat the image to 3 channels, 1 for the image as it is
         """
         self.num_node_feats = num_node_feats
+        self.in_channels = in_channels
         self.path = path
         self.labels = labels
         self.file_list = []
@@ -239,27 +174,28 @@ class AugmentInstanceDataset(Dataset):
 
     def __getitem__(self, index):
         key, full_instance_dir = self.file_list[index]
-        with open(full_instance_dir, 'rb') as in_file:
-            data = pickle.load(in_file)
-            A = data['adj'] # A： （N, N） distance matrix
-            A = A.todense()
+        # the out of band dump of util (or a plain pickle), one read per file
+        data = load_pickle(full_instance_dir)
+        A = data['adj'] # A： （N, N） distance matrix
+        A = A.todense()
 
-            label = np.zeros(shape = (1), dtype = np.int)
-            idx = self.label_map[self.labels[key]]
-            label[0] = idx
-            label = torch.LongTensor(label)
-            image = torch.FloatTensor(A)
-            #image = self.padding(image)
+        label = np.zeros(shape = (1), dtype = np.int64)
+        idx = self.label_map[self.labels[key]]
+        label[0] = idx
+        label = torch.LongTensor(label)
+        image = torch.FloatTensor(A)
+        #image = self.padding(image)
 
+        if self.in_channels == 3:
             # repeat to 3 channels
             image = image.repeat(1, 3)
             image = image.view((3, image.shape[0], image.shape[0]))
-
+        else:
             # for 1 channel
-            #image = image.view((1, image.shape[0], image.shape[0]))
+            image = image.view((1, image.shape[0], image.shape[0]))
 
-            #print(image.shape)
-            return image, label
+        #print(image.shape)
+        return image, label
 
     def padding(self, A):
         delta_width = 256 - A.shape[0]
@@ -275,113 +211,317 @@ class AugmentInstanceDataset(Dataset):
 
 
 
-class ArgumentDataset(Dataset):
-    def __init__(self, args, path, labels, transform = default_val_transforms):
+def instance_name(key):
+    """
+    label key -> '<dataset>/<instance id>', the instance file relative to the instances path
+    """
+    dataset = key.strip().split('_')[0]
+    instance_id = key.strip().split('_')[1]
+    if dataset == 'morphed':
+        node_num = instance_id.strip().split('-')[0]
+        tmp1, tmp2 = instance_id.strip().split('---')[0], instance_id.strip().split('---')[1]
+        instance_id = node_num + "---" + tmp1 + '.tsp---' + tmp2 + '.tsp'
+    return dataset + '/' + instance_id
+
+
+def load_coordinates(path, names):
+    """
+    read the <path>/<name>.coo.pickle files into an in-memory CoordinateStore
+    """
+    arrays = []
+    for name in names:
+        full_instance_dir = os.path.join(path, name) + '.coo.pickle'
+        with open(full_instance_dir, 'rb') as in_file:
+            data = pickle.load(in_file)
+            arrays.append(data['x'])
+    return CoordinateStore.from_arrays(names, arrays)
+
+
+LABEL_MAP = {'eax': 0,
+             'eax.restart': 1,
+             'lkh': 2,
+             'lkh.restart': 3,
+             'maos': 4}
+
+
+def to_time_array(labels, keys, label_map = LABEL_MAP):
+    """
+    (N, # algorithms) median runtimes of the instances keys, in the order of label_map
+    """
+    run_time = np.zeros(shape=(len(keys), len(label_map)), dtype=np.float64)
+    for i, key in enumerate(keys):
+        for algorithm, value in labels[key][1].items():
+            run_time[i, label_map[algorithm]] = value
+    return run_time
+
+
+def to_sce_labels(run_time, exp = 2.0):
+    """
+    soft labels of (N, C) runtimes: 1 / runtime^exp of the 3 fastest algorithms, normalized per instance
+    """
+    baseline = np.sort(run_time, axis=1)[:, -3:-2]
+    mask = np.where(run_time > baseline, 0, 1)
+    label = 1.0 / np.power(run_time, exp) * mask
+    return label / label.sum(axis=1, keepdims=True)
+
+
+def to_bce_labels(run_time, decay_factor = 0.9):
+    """
+    decay_factor^rank of the 3 fastest algorithms, 0 for the others
+    """
+    rank = run_time.argsort(axis=1).argsort(axis=1)
+    mask = np.where(rank > 2, 0, 1)
+    return np.power(decay_factor, rank) * mask
+
+
+def run_time_normalize(run_time):
+    min_time, max_time = run_time.min(axis=1, keepdims=True), run_time.max(axis=1, keepdims=True)
+    res = run_time - min_time / (max_time - min_time)
+    return res
+
+
+def to_nll_weights(run_time, exp = 2.0):
+    """
+    (N, C) runtime^exp normalized over the algorithms of every instance,
+    cnn.WeightedNLLLoss weights an instance by the column of its predicted algorithm
+    """
+    weights = np.power(run_time, exp)
+    return weights / weights.sum(axis=1, keepdims=True)
+
+
+def to_nll_labels(labels, keys, label_map = LABEL_MAP):
+    """
+    (N, 1) index of the best algorithm
+    """
+    return np.array([[label_map[labels[key][0]]] for key in keys], dtype=np.int64).reshape(-1, 1)
+
+
+class InstanceRegistry(object):
+    """
+    all instances of a cross validation run, loaded once and shared by the datasets of every fold
+    """
+    def __init__(self, path, labels, coordinates = None):
+        """
+        path: the directory of the .coo.pickle files
+        labels: dictionary of instance -> (best algorithm, algorithm -> median runtime)
+        coordinates: CoordinateStore holding the instances of labels (e.g. the packed file of --coordinates),
+                     read from the .coo.pickle files under path if None
+        """
         self.path = path
         self.labels = labels
+        self.keys = list(labels.keys())
+        names = [instance_name(key) for key in self.keys]
+        self.coordinates = load_coordinates(path, names) if coordinates is None else coordinates
+        self.rows = self.coordinates.index(names)
+        self.num = len(self.keys)
+        # (N, # algorithms) median runtimes, the labels of every loss type are derived from them once
+        self.run_time = to_time_array(labels, self.keys)
+        self._targets = {}
+        self._weights = {}
+
+    def __len__(self):
+        return self.num
+
+    def targets(self, label_type):
+        """
+        (N, ...) label array of the loss type, built on the first call and shared by the datasets of every fold
+        """
+        if label_type not in self._targets:
+            if label_type == 'nll':
+                target = torch.from_numpy(to_nll_labels(self.labels, self.keys))
+            elif label_type == 'sce':
+                target = torch.from_numpy(to_sce_labels(self.run_time)).float()
+            elif label_type == 'bce':
+                target = torch.from_numpy(to_bce_labels(self.run_time)).float()
+            elif label_type == 'mse':
+                target = torch.from_numpy(run_time_normalize(self.run_time)).float()
+            else:
+                raise ValueError("unknown loss type {}, expect nll, sce, bce or mse".format(label_type))
+            self._targets[label_type] = target
+        return self._targets[label_type]
+
+    def weights(self, label_type, exp = 2.0):
+        """
+        (N, C) loss weights of the loss type, built on the first call and shared by the datasets of every fold:
+        the normalized runtime^exp for nll, the runtimes for the other losses
+        """
+        if (label_type, exp) not in self._weights:
+            if label_type == 'nll':
+                weights = torch.from_numpy(to_nll_weights(self.run_time, exp))
+            else:
+                weights = torch.from_numpy(self.run_time)
+            self._weights[(label_type, exp)] = weights
+        return self._weights[(label_type, exp)]
+
+
+class ArgumentDataset(Dataset):
+    def __init__(self, args, registry, indices = None, transform = default_val_transforms):
+        """
+        view of the instances indices (all if None) of an InstanceRegistry with its own transform
+        transform: coordinates -> image (or its non-zero cells, see transform.ToSparse),
+                   or None to return the coordinates for batch-level transforms
+        """
+        self.registry = registry
+        self.labels = registry.labels
         self.label_type = args.loss_type
+        # 3: the density image in the 3 channel layout of the torchvision models, 1: as it is
+        self.in_channels = args.input_channels
         self.transform = transform
-        self.all_coordinates = []
-        self.label_map = {'eax': 0,
-                          'eax.restart': 1,
-                          'lkh': 2,
-                          'lkh.restart': 3,
-                          'maos': 4}
-        for key in labels.keys():
-            dataset = key.strip().split('_')[0]
-            instance_id = key.strip().split('_')[1]
-            if dataset == 'morphed':
-                node_num = instance_id.strip().split('-')[0]
-                tmp1, tmp2 = instance_id.strip().split('---')[0], instance_id.strip().split('---')[1]
-                instance_id = node_num + "---" + tmp1 + '.tsp---' + tmp2 + '.tsp'
-            full_instance_dir = os.path.join(path, dataset, instance_id) + '.coo.pickle'
-            with open(full_instance_dir, 'rb') as in_file:
-                data = pickle.load(in_file)
-                x = data['x']
-                self.all_coordinates.append((key, x))
-                in_file.close()
-        self.num = len(self.all_coordinates)
+        self.label_map = LABEL_MAP
+        self.indices = np.arange(len(registry)) if indices is None else np.asarray(indices, dtype=np.int64)
+        self.num = self.indices.shape[0]
+        self.labels_array = registry.targets(self.label_type)
+        self.weights = registry.weights(self.label_type, args.weight_exp)
+        self.run_time = torch.from_numpy(registry.run_time)
 
     def __getitem__(self, index):
-        key, x = self.all_coordinates[index]
-
-        algorithm_to_median = self.labels[key][1]
-
-        run_time = self.to_time_tensor(algorithm_to_median)
-
-        # generate the label
-        if self.label_type == 'nll':
-            label = self.to_nll_label_tensor(key)
-            label = torch.LongTensor(label)
-        elif self.label_type == 'sce':
-            label = self.to_sce_label_tensor(run_time)
-            label = torch.FloatTensor(label)
-        elif self.label_type == 'bce':
-            label = self.to_bce_label_tensor(run_time)
-            label = torch.FloatTensor(label)
-        elif self.label_type == 'mse':
-            label = self.to_mse_label_tensor(run_time)
-            label = torch.FloatTensor(label)
-
-        # generate the weights
-        weights = self.run_time_normalize(run_time)
-        weights = torch.FloatTensor(weights)
+        index = self.indices[index]
+        key = self.registry.keys[index]
+        # copy out of the (read-only, shared) coordinate buffer, the transforms work in place
+        x = np.array(self.registry.coordinates[self.registry.rows[index]])
 
-        # generate the image
-        image = self.transform(x)
-        # repeat to 3 channels
-        image = image.repeat(1, 3)
-        image = image.view((3, image.shape[0], image.shape[0]))
+        label, weights, run_time = self.labels_array[index], self.weights[index], self.run_time[index]
 
-        return image, label, run_time, run_time
+        if self.transform is None:
+            # raw coordinates, rasterized per batch by transform.BatchTransformation
+            return torch.from_numpy(x), label, weights, run_time
+
+        # generate the image
+        if isinstance(self.transform, CachedTransformation):
+            image = self.transform(x, key)
+        else:
+            image = self.transform(x)
+        if torch.is_tensor(image) and image.dim() == 2:
+            if self.in_channels == 3:
+                # repeat to 3 channels
+                image = image.repeat(1, 3)
+                image = image.view((3, image.shape[0], image.shape[0]))
+            else:
+                # for 1 channel
+                image = image.view((1, image.shape[0], image.shape[0]))
+
+        return image, label, weights, run_time
 
 
     def __len__(self):
         return self.num
 
-    def to_time_tensor(self, algorithm_to_median):
-        run_time = np.zeros(shape=(len(self.label_map)), dtype=np.float)
-        for key, value in algorithm_to_median.items():
-            run_time[self.label_map[key]] = value
-        return run_time
-
-    def to_sce_label_tensor(self, run_time, exp = 2.0):
-        '''
-        run_time: numpy array of running time
-        '''
-
-        baseline = run_time[np.argsort(run_time)[-3]]
-        #print("baseline : {}".format(baseline))
-        mask = np.where(run_time > baseline, 0, 1)
-        label = 1.0 / np.power(run_time, exp)
-        label = np.multiply(label, mask)
-        label = label / np.sum(label)
-        #print("label: {}".format(label))
-        return label
-
-
-    def to_bce_label_tensor(self, run_time, decay_factor = 0.9):
-        order = run_time.argsort()
-        rank = order.argsort()
-        mask = np.where(rank > 2, 0, 1)
-        label = np.power(decay_factor, rank)
-        label = np.multiply(label, mask)
-        return label
-
-
-    def to_mse_label_tensor(self, run_time):
-        label = self.run_time_normalize(run_time)
-        return label
-
-    def to_nll_label_tensor(self, key):
-        # labels for nll loss
-        label = np.zeros(shape=(1), dtype=np.int)
-        idx = self.label_map[self.labels[key][0]]
-        label[0] = idx
-        return label
 
+class GraphBatchSampler(Sampler):
+    """
+    batches of graph indices packed in (shuffled) order until the next graph would exceed max_nodes nodes
+    or max_edges edges, so variable-size TSP graphs give batches of about the same size,
+    a graph larger than the budget is a batch of its own
+    """
+    def __init__(self, num_nodes, num_edges, max_nodes, max_edges = None, shuffle = True):
+        """
+        num_nodes, num_edges: (# graphs, ) sizes of the graphs of the dataset
+        """
+        self.num_nodes = np.asarray(num_nodes, dtype=np.int64)
+        self.num_edges = np.asarray(num_edges, dtype=np.int64)
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+        self.shuffle = shuffle
+        self._batches = None
+
+    def pack(self, order):
+        batches, batch, nodes, edges = [], [], 0, 0
+        for index in order:
+            new_nodes, new_edges = nodes + self.num_nodes[index], edges + self.num_edges[index]
+            if batch and (new_nodes > self.max_nodes or (self.max_edges is not None and new_edges > self.max_edges)):
+                batches.append(batch)
+                batch, new_nodes, new_edges = [], self.num_nodes[index], self.num_edges[index]
+            batch.append(int(index))
+            nodes, edges = new_nodes, new_edges
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def __iter__(self):
+        order = np.random.permutation(self.num_nodes.shape[0]) if self.shuffle else np.arange(self.num_nodes.shape[0])
+        self._batches = self.pack(order)
+        return iter(self._batches)
+
+    def __len__(self):
+        # the number of batches of the last epoch, the packing of a shuffled order varies a little
+        if self._batches is None:
+            self._batches = self.pack(np.arange(self.num_nodes.shape[0]))
+        return len(self._batches)
+
+
+GRAPH_METHODS = ('complete', 'knn', 'delaunay')
+
+
+def load_graph(filename, graph = 'complete'):
+    """
+    the complete graph of util.load_tsp_instance (memory-mapped), or the knn / delaunay graph of
+    util.save_tsp_graph, util is imported on the first call since it needs matplotlib
+    """
+    from util import load_norm_instance, load_tsp_graph
+    if graph == 'complete':
+        return load_norm_instance(filename, mmap_mode='r')
+    return load_tsp_graph(filename, graph)
+
+
+class GeoInstanceDataset(Dataset):
+    def __init__(self, num_node_feats, path, labels, keys = None, edge_prob = 0.5, graph = 'complete'):
+        """
+        path: the directory of the instance graphs, <instance>_norm/*.npy of util.load_tsp_instance for
+              the complete graph, <instance>_<graph>.pickle of util.save_tsp_graph otherwise
+        labels: dictionary of instance -> (best algorithm, algorithm -> median runtime)
+        keys: the instances of labels in the dataset, all if None
+        edge_prob: share of the edges of the complete graph sampled for every item
+        graph: complete, knn or delaunay, the knn / delaunay graphs are used as they are
+        """
+        if Data is None:
+            raise ImportError("GeoInstanceDataset needs torch_geometric")
+        if graph not in GRAPH_METHODS:
+            raise ValueError("unknown graph {}, expect complete, knn or delaunay".format(graph))
+        self.num_node_feats = num_node_feats
+        self.path = path
+        self.labels = labels
+        self.keys = list(labels.keys()) if keys is None else list(keys)
+        self.label_map = LABEL_MAP
+        # the .tsp file name the graph files are derived from
+        self.file_list = [(key, os.path.join(path, instance_name(key)) + '.tsp') for key in self.keys]
+        self.num = len(self.file_list)
+        self.graph = graph
+        # the sparse graphs are not sampled
+        self.edge_prob = edge_prob if graph == 'complete' else 1.0
+        self.run_time = torch.from_numpy(to_time_array(labels, self.keys)).float()
+
+    def __getitem__(self, index):
+        key, full_instance_dir = self.file_list[index]
+        data = load_graph(full_instance_dir, self.graph)
+        x, edge_index, edge_attr = data['x'], data['edge_index'], data['edge_attr']
+        # x : (N, 2)
+
+        if self.edge_prob < 1.0:
+            # inverse-distance weighted sample without replacement, the race scale of an edge is its length
+            edge_index, edge_attr = edge_sampler(edge_index, edge_attr, self.edge_prob)
 
-    def run_time_normalize(self, run_time):
-        min_time, max_time = np.min(run_time), np.max(run_time)
-        res = run_time - min_time / (max_time - min_time)
-        return res
\ No newline at end of file
+        label = torch.LongTensor([self.label_map[self.labels[key][0]]])
+        x = torch.FloatTensor(np.array(x))
+        edge_index = torch.LongTensor(edge_index)
+        # (E, 1), the edge networks of MPNN take num_edge_feats = 1 features per edge
+        edge_attr = torch.FloatTensor(edge_attr).view(-1, 1)
+
+        # run_time: (1, # algorithms), batched along the graphs for the selection metrics
+        return Data(x = x, edge_index = edge_index, edge_attr = edge_attr, y = label,
+                    run_time = self.run_time[index: index + 1])
+
+    def __len__(self):
+        return self.num
+
+    def graph_sizes(self):
+        """
+        (# nodes, # sampled edges) of every instance for GraphBatchSampler, from the headers of the memory-mapped
+        arrays of util.load_tsp_instance for the complete graph
+        """
+        num_nodes = np.zeros(self.num, dtype=np.int64)
+        num_edges = np.zeros(self.num, dtype=np.int64)
+        for i, (key, full_instance_dir) in enumerate(self.file_list):
+            data = load_graph(full_instance_dir, self.graph)
+            num_nodes[i] = data['x'].shape[0]
+            num_edges[i] = sample_size(data['edge_attr'].shape[0], self.edge_prob)
+        return num_nodes, num_edges
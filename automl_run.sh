@@ -16,4 +16,5 @@ $PYTHON train.py \
   --flip ##flip## \
   --num_workers 16 \
   --num_fold 5 \
-  --instances_path "ECJ_instances_coo"
\ No newline at end of file
+  --instances_path "ECJ_instances_coo" \
+  --coordinates "ECJ_instances_coo.pack"
\ No newline at end of file
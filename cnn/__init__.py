@@ -1,3 +1,3 @@
-from .model import SimpleCNN
+from .model import SimpleCNN, PointNet
 from .layers import softCrossEntropy, WeightedMeanSquareError, WeightedMultiLabelBinaryClassification, WeightedNLLLoss
-from .util import select_model, select_criterion
\ No newline at end of file
+from .util import select_model, select_criterion, set_in_channels, fold_stem_weights, load_checkpoint
\ No newline at end of file
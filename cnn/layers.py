@@ -1,4 +1,3 @@
-import numpy as np
 import torch
 import torch.nn.functional as F
 
@@ -6,7 +5,6 @@ from torch.nn import BCEWithLogitsLoss, MSELoss
 from torch.nn.modules.module import Module
 
 
-
 class softCrossEntropy(Module):
     """
     Soft label Cross Entropy Loss
@@ -26,7 +24,7 @@ class softCrossEntropy(Module):
         sample_num, class_num = target.shape
         loss = torch.mul(log_likelihood, target)
         if weights is not None:
-            loss = torch.mul(loss, weights)
+            loss = torch.mul(loss, weights.to(loss.dtype))
         loss = torch.sum(loss)/sample_num
 
         return loss
@@ -50,7 +48,7 @@ class WeightedMultiLabelBinaryClassification(Module):
         loss = self.bce(inputs, target)
         sample_num, class_num = target.shape
         if weights is not None:
-            loss = torch.mul(loss, weights)
+            loss = torch.mul(loss, weights.to(loss.dtype))
         loss = torch.sum(loss) / sample_num
         return loss
 
@@ -68,14 +66,15 @@ class WeightedMeanSquareError(Module):
         loss = self.mse(inputs, target)
         sample_num, class_num = target.shape
         if weights is not None:
-            loss = torch.mul(loss, weights)
+            loss = torch.mul(loss, weights.to(loss.dtype))
         loss = torch.sum(loss) / sample_num
         return loss
 
 
 class WeightedNLLLoss(Module):
     """
-    Hard Label Cross Entropy Loss
+    Hard Label Cross Entropy Loss, every instance weighted by the normalized runtime^exp of the predicted algorithm
+    (InstanceLoader.to_nll_weights, computed once for all instances)
     """
     def __init__(self):
         super(WeightedNLLLoss, self).__init__()
@@ -88,23 +87,15 @@ class WeightedNLLLoss(Module):
         sample_num  = target.shape[0]
         if weights is not None:
             weights = self.generate_weights(inputs, weights)
-            weights = weights.cuda()
-            loss = torch.dot(loss, weights)
+            loss = torch.dot(loss, weights.to(loss.dtype))
         loss = loss / sample_num
         return loss
 
-    def generate_weights(self, outputs, run_time, exp=2.0):
-        outputs = torch.nn.functional.log_softmax(outputs, dim=1)
-        idx = torch.argmax(outputs, dim=1)
-        idx, run_time = idx.cpu().numpy(), run_time.cpu().numpy()
-
-        weights = np.zeros(shape=(idx.shape[0]), dtype=np.float32)
-        for i in range(idx.shape[0]):  # iterate for batch
-            wei = np.power(run_time[i], exp)  # weight normalization by classes
-            wei = wei / np.sum(wei)
-            weights[i] = wei[idx[i]]
-            # weights[i] = pow(run_time[i][idx[i]], exp)
-        # weights = weights / np.sum(weights)
-        # print(weights)
-        weights = torch.FloatTensor(weights)
-        return weights
\ No newline at end of file
+    def generate_weights(self, outputs, weights):
+        """
+        :param outputs: predictions: N * C
+        :param weights: weights of every algorithm: N * C
+        :return: N weights
+        """
+        idx = torch.argmax(outputs.detach(), dim=1, keepdim=True)
+        return weights.gather(1, idx).squeeze(1)
@@ -31,7 +31,7 @@ class SimpleCNN(nn.Module):
 class SimpleCNN(nn.Module):
     def __init__(self, num_classes, num_cov_layer, channels,
                  kernel_size, stride, num_mlp_layer, mlp_hids,
-                 adp_output_size = 6, dropout = 0.5):
+                 adp_output_size = 6, dropout = 0.5, in_channels = 3):
         super(SimpleCNN, self).__init__()
         num_channels = self.parse_layer_para(channels)
         num_mlp_hids = self.parse_layer_para(mlp_hids)
@@ -41,7 +41,7 @@ class SimpleCNN(nn.Module):
         modules = []
         for layer in range(num_cov_layer):
             if layer == 0:
-                cov = nn.Conv2d(3, num_channels[layer], kernel_size= 11, stride = 4, padding= 2)
+                cov = nn.Conv2d(in_channels, num_channels[layer], kernel_size= 11, stride = 4, padding= 2)
             else:
                 cov = nn.Conv2d(num_channels[layer - 1], num_channels[layer],
                                 kernel_size= kernel_size, padding= 1)
@@ -79,4 +79,44 @@ class SimpleCNN(nn.Module):
 
     def parse_layer_para(self, para_list_str):
         para_list_str = para_list_str.strip().split()
-        return [int(para) for para in para_list_str]
\ No newline at end of file
+        return [int(para) for para in para_list_str]
+
+class PointNet(nn.Module):
+    """
+    DeepSets / PointNet selector on the normalized coordinates
+    a shared MLP embeds every city, the masked max and mean over the cities of an instance
+    feed the classifier, so the cost is linear in the number of cities and independent of any grid
+    """
+    def __init__(self, num_classes, point_hids = '64 128 256', mlp_hids = '256 128', dropout = 0.5):
+        super(PointNet, self).__init__()
+        num_point_hids = self.parse_layer_para(point_hids)
+        num_mlp_hids = self.parse_layer_para(mlp_hids)
+
+        point_layers = []
+        for layer, num_hid in enumerate(num_point_hids):
+            point_layers.append(nn.Linear(2 if layer == 0 else num_point_hids[layer - 1], num_hid))
+            point_layers.append(nn.ReLU(inplace=True))
+        self.point_mlp = nn.Sequential(*point_layers)
+
+        classifier = []
+        for layer, num_hid in enumerate(num_mlp_hids):
+            classifier.append(nn.Dropout(p = dropout))
+            classifier.append(nn.Linear(2 * num_point_hids[-1] if layer == 0 else num_mlp_hids[layer - 1], num_hid))
+            classifier.append(nn.ReLU(inplace= True))
+        classifier.append(nn.Linear(num_mlp_hids[-1], num_classes))
+        self.classifier = nn.Sequential(*classifier)
+
+    def forward(self, data):
+        """
+        :param data: (x, mask), x: (B, N, 2) padded normalized coordinates, mask: (B, N) True for the cities
+        """
+        x, mask = data
+        h = self.point_mlp(x) # (B, N, # hid)
+        mask = mask.unsqueeze(2)
+        h_max = h.masked_fill(~mask, float('-inf')).max(dim=1)[0]
+        h_mean = (h * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        return self.classifier(torch.cat([h_max, h_mean], dim=1))
+
+    def parse_layer_para(self, para_list_str):
+        para_list_str = para_list_str.strip().split()
+        return [int(para) for para in para_list_str]
@@ -1,9 +1,65 @@
+import torch
+import torch.nn as nn
 from torchvision.models import  alexnet, resnet18, vgg11, vgg11_bn, vgg16, vgg16_bn, resnet34, resnet50
-from cnn import SimpleCNN, softCrossEntropy, WeightedMultiLabelBinaryClassification, WeightedMeanSquareError, WeightedNLLLoss
+from cnn import SimpleCNN, PointNet, softCrossEntropy, WeightedMultiLabelBinaryClassification, WeightedMeanSquareError, WeightedNLLLoss
 import sys
 
+
+def stem(model):
+    """
+    (name, module) of the first convolution of model, conv1 of resnet, features.0 of alexnet, vgg and SimpleCNN,
+    (None, None) for models without convolution (PointNet)
+    """
+    for name, module in model.named_modules():
+        if isinstance(module, nn.Conv2d):
+            return name, module
+    return None, None
+
+
+def set_in_channels(model, in_channels):
+    """
+    replace the stem of model by a convolution of in_channels input channels
+    """
+    name, conv = stem(model)
+    if conv is None or conv.in_channels == in_channels:
+        return model
+    new_conv = nn.Conv2d(in_channels, conv.out_channels, kernel_size=conv.kernel_size, stride=conv.stride,
+                         padding=conv.padding, dilation=conv.dilation, groups=conv.groups,
+                         bias=conv.bias is not None)
+    parent = model
+    for attr in name.split('.')[:-1]:
+        parent = getattr(parent, attr)
+    setattr(parent, name.split('.')[-1], new_conv)
+    return model
+
+
+def fold_stem_weights(model, state_dict):
+    """
+    fit the stem weights of a 3 channel state_dict to a 1 channel stem of model by summing over the input
+    channels, the 1 channel model gives the same outputs on an image as the 3 channel model on 3 copies of it
+    """
+    name, conv = stem(model)
+    if conv is None:
+        return state_dict
+    key = name + '.weight'
+    weight = state_dict[key]
+    if weight.shape[1] != conv.in_channels:
+        if conv.in_channels != 1:
+            raise ValueError("cannot fold {} input channels of {} into {}".format(weight.shape[1], key,
+                                                                                 conv.in_channels))
+        state_dict[key] = weight.sum(dim=1, keepdim=True)
+    return state_dict
+
+
+def load_checkpoint(model, filename):
+    state_dict = torch.load(filename, map_location='cpu')
+    model.load_state_dict(fold_stem_weights(model, state_dict))
+    return model
+
+
 def select_model(args):
     model_type = args.model_type
+    in_channels = args.input_channels
     kwargs = {"num_classes" : args.num_classes}
 
     if model_type == 'alexnet':
@@ -22,14 +78,22 @@ def select_model(args):
         model = vgg16(pretrained=False, progress=True, **kwargs)
     elif model_type == 'vgg16_bn':
         model = vgg16_bn(pretrained=False, progress=True, **kwargs)
+    elif model_type == 'pointnet':
+        # on the coordinates, see transform.BatchPointTransformation
+        model = PointNet(num_classes= args.num_classes, point_hids= args.point_hids,
+                         mlp_hids= args.point_mlp_hids, dropout= args.dropout)
     else:
 
         model = SimpleCNN(num_classes= args.num_classes, num_cov_layer=args.num_cov_layer, channels= args.channels,
                           kernel_size= args.kernel_size, stride= args.stride,
                           num_mlp_layer=args.num_mlp_layer, mlp_hids= args.mlp_hids,
-                          adp_output_size=args.adp_output_size, dropout= args.dropout)
+                          adp_output_size=args.adp_output_size, dropout= args.dropout, in_channels= in_channels)
 
         #model = SimpleCNN(num_classes=5)
+    # native stem for 1 channel (or multi-channel) images
+    model = set_in_channels(model, in_channels)
+    if args.checkpoint:
+        model = load_checkpoint(model, args.checkpoint)
 
     if args.verbose:
         print(model)
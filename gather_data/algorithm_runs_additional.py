@@ -6,6 +6,7 @@ import os
 import datetime
 from glob import glob
 import numpy as np
+from store import PerformanceTensor, structured_to_tensor
 
 
 def extract_result(needtest, data, insts,
@@ -48,31 +49,31 @@ def extract_result(needtest, data, insts,
 
 
 def summary():
-    out_dir = 'data/TSP/additional/runs/'
-    result_files = glob('%s*_algorithm_runs*' % out_dir)
+    perf = PerformanceTensor.open('data/TSP/additional/runs/performance')
     f = open('data/TSP/additional/algorithm_runs.csv', 'w+')
     f.write('ins_name,alg_name,repeat,status,runtime\n')
-    for result_file in result_files:
-        pm = np.load(open(result_file, 'rb'))
-        ins_size, repeat_times, algs_size = pm.shape
-        for ins_index in range(ins_size):
-            for alg_index in range(algs_size):
-                for repeat_index in range(repeat_times):
-                    v = pm[ins_index, repeat_index, alg_index]
-                    f.write('%s,%s,%d,%s,%.2f\n' % (v['ins_name'].decode("utf-8"),
-                                                    v['alg'].decode("utf-8"),
-                                                    repeat_index,
-                                                    v['status'].decode(
-                                                        "utf-8"),
-                                                    round(v['runtime'], 2)))
+    for ins_index, ins_name in enumerate(perf.ins_names):
+        for alg_index, alg_name in enumerate(perf.algorithm_names):
+            for repeat_index in range(perf.num_repeat):
+                status = perf.status[ins_index, repeat_index, alg_index]
+                f.write('%s,%s,%d,%s,%.2f\n' % (ins_name, alg_name, repeat_index,
+                                                perf.status_names[status] if status >= 0 else '',
+                                                round(float(perf.runtime[ins_index, repeat_index, alg_index]), 2)))
 
     f.close()
 
 
+def convert(result_dir='data/TSP/additional/runs/'):
+    # import the per-family *_algorithm_runs.npy files of older runs into the performance tensor
+    for result_file in sorted(glob('%s*_algorithm_runs.npy' % result_dir)):
+        option = os.path.basename(result_file)[:-len('_algorithm_runs.npy')]
+        pm = np.load(open(result_file, 'rb'))
+        structured_to_tensor(result_dir + 'performance', pm, option)
+
+
 if __name__ == '__main__':
-    # python algorithm_runs.py paralism option
+    # from the repository root: python -m gather_data.algorithm_runs_additional paralism option
     # for each algorithm, we run it on each instance for three times
-    os.chdir('..')
     maxParalism = int(sys.argv[1])
     options = sys.argv[2:]
 
@@ -206,5 +207,7 @@ if __name__ == '__main__':
                            ins_num, algos, repeat, output_dir, cutoff_time, option)
             re_test += 1
 
-        np.save(result_dir + '%s_algorithm_runs' % option, algorithm_runs)
+        # append the instances of this option to the performance tensor of result_dir
+        perf = PerformanceTensor.open(result_dir + 'performance', [t[0] for t in algos], repeat)
+        perf.append(instances, algorithm_runs['runtime'], algorithm_runs['status'], option)
         print(datetime.datetime.now())
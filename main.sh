@@ -3,8 +3,12 @@ unset http_proxy
 unset https_proxy
 mkdir -p /opt/ml/env/out
 mkdir -p /opt/ml/disk/out
-cp /opt/ml/disk/ECJ_instances_coo.zip .
-unzip ECJ_instances_coo.zip
+# pack the coordinates once, later jobs memory-map the packed file instead of unzipping every instance
+if [ ! -f /opt/ml/disk/ECJ_instances_coo.pack ]; then
+  /root/anaconda3/bin/python -m store.coords /opt/ml/disk/ECJ_instances_coo.zip /opt/ml/disk/ECJ_instances_coo.pack
+fi
+cp /opt/ml/disk/ECJ_instances_coo.pack .
+unzip -o /opt/ml/disk/ECJ_instances_coo.zip 'ECJ_instances_coo/algorithm_runs.arff.txt'
 ls .
 pwd .
 echo START
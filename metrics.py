@@ -0,0 +1,76 @@
+import torch
+
+
+"""
+algorithm selection metrics accumulated as tensors on the device of the model outputs,
+the host only reads them once in compute(), so metrics of the training forward passes are almost free
+"""
+
+
+# accumulator slots
+CORRECT, NUM, PRED, SINGLE_BEST, BEST, IMPROVE = range(6)
+
+
+class SelectionMetrics(object):
+    def __init__(self, loss_type = 'nll', single_best = 1):
+        """
+        loss_type: 'mse' predicts the smallest output, the other losses the largest one
+        single_best: column of the single best solver in the runtimes, 1 -> eax.restart
+        """
+        self.loss_type = loss_type
+        self.single_best = single_best
+        self.reset()
+
+    def reset(self):
+        self.totals = None
+
+    def predict(self, outputs):
+        # log_softmax and sigmoid keep the order of the outputs
+        if self.loss_type == 'mse':
+            return torch.argmin(outputs, dim=1)
+        return torch.argmax(outputs, dim=1)
+
+    def target(self, label):
+        """
+        label tensor of the loss type -> index of the best algorithm
+        """
+        if label.dim() == 2 and label.shape[1] > 1:
+            return torch.argmin(label, dim=1) if self.loss_type == 'mse' else torch.argmax(label, dim=1)
+        return label.reshape(-1)
+
+    @torch.no_grad()
+    def update(self, outputs, label, run_time = None):
+        """
+        :param outputs: predictions: N * C
+        :param label: labels of the loss type
+        :param run_time: runtimes: N * C, moved to the device of outputs if needed
+        """
+        outputs = outputs.detach().reshape(-1, outputs.shape[-1])
+        if self.totals is None:
+            self.totals = torch.zeros(6, dtype=torch.float64, device=outputs.device)
+        idx = self.predict(outputs)
+        target = self.target(label.to(outputs.device, non_blocking=True))
+        self.totals[CORRECT] += (idx == target).sum()
+        self.totals[NUM] += idx.shape[0]
+        if run_time is not None:
+            run_time = run_time.to(outputs.device, dtype=torch.float64, non_blocking=True)
+            pred = run_time.gather(1, idx.unsqueeze(1)).squeeze(1)
+            single_best = run_time[:, self.single_best]
+            self.totals[PRED] += pred.sum()
+            self.totals[SINGLE_BEST] += single_best.sum()
+            self.totals[BEST] += run_time.min(dim=1)[0].sum()
+            self.totals[IMPROVE] += (pred <= single_best).sum()
+
+    def compute(self):
+        """
+        accuracy, improve rate (share of instances where the prediction is not slower than the single best),
+        and the total runtime (PAR) of the predictions, the single best and the virtual best solver
+        """
+        totals = [0.0] * 6 if self.totals is None else self.totals.tolist()
+        num = max(totals[NUM], 1)
+        return {'num_instances': int(totals[NUM]),
+                'accuracy': totals[CORRECT] / num,
+                'pred_performance': totals[PRED],
+                'single_best_performance': totals[SINGLE_BEST],
+                'best_performance': totals[BEST],
+                'improve_rate': totals[IMPROVE] / num}
@@ -1,11 +1,14 @@
 # pre-proccess script for ECJ paper data
 # data structures: instance_name, feature, label
+# run from ml/ (the data paths are relative to it) with the repository root on the path for store:
+# cd ml && PYTHONPATH=.. python feature_selection.py
 import random as rd
 from copy import deepcopy
 import pandas as pd
 import arff
 import numpy as np
 from sklearn.model_selection import train_test_split
+from store import aggregate_runs_file, PerformanceTensor, load_features
 
 
 class create_labels_for_ECJ(object):
@@ -17,12 +20,12 @@ class create_labels_for_ECJ(object):
         self.rep_run = rep_run
 
     def __call__(self, out_dir="../data/aslib_data-not_verified/TSP-ECJ2018/"):
-        runs = arff.load(open(self.__file, 'r'))
-        x = [tuple(run) for run in runs['data']]
-        x = np.array(x, dtype=[('id', 'S40'), ('run_count', '<i4'),
-                               ('alg', 'S10'), ('runtime', 'f'), ('status', 'S10')])
-
-        ins_num = int(x.shape[0] / (self.alg_num * self.rep_run))
+        # any number of repeats is handled by the aggregation, rep_run is kept for compatibility
+        # float32 medians and means as the f4 arrays of the labels
+        result = aggregate_runs_file(self.__file, t_max=self.t_max, penalize_factor=self.pel,
+                                     dtype=np.float32)
+        ins_num = len(result['ins_names'])
+        assert len(result['algorithm_names']) == self.alg_num
 
         performance = np.ndarray(shape=(ins_num, ),
                                  dtype=[('id', 'S40'), ('label', 'i4'),
@@ -31,31 +34,19 @@ class create_labels_for_ECJ(object):
                                         ('runtime_3', 'f4'), ('status_3', 'S10'),
                                         ('runtime_4', 'f4'), ('status_4', 'S10'),
                                         ('runtime_5', 'f4'), ('status_5', 'S10')])
-        count = 0
-        for ins_index in range(ins_num):
-            runtime_array = np.ndarray(shape=(self.alg_num,), dtype='f4')
-            mean_runtime_array = np.ndarray(shape=(self.alg_num,), dtype='f4')
-            for alg_index in range(self.alg_num):
-                tmp = x[ins_index*self.alg_num*self.rep_run+alg_index :\
-                        (ins_index+1)*self. alg_num*self.rep_run : self.alg_num]
-                if np.sum(tmp['status'] == b'ok') >= 6:
-                    runtime = np.round(np.median(tmp['runtime']), 3)
-                    status = 'ok'
-                else:
-                    runtime = np.round(self.t_max * self.pel, 3)
-                    status = 'timeout'
-                performance[ins_index]['id'] = tmp[0]['id']
-                performance[ins_index]['runtime_%d'%(alg_index+1)] = runtime
-                performance[ins_index]['status_%d'%(alg_index+1)] = status
-                runtime_array[alg_index] = runtime
-                mean_runtime_array[alg_index] = np.round(np.mean(tmp['runtime']), 3)
-
-            indices = np.where(runtime_array == runtime_array.min())[0]
-            if indices.shape[0] > 1:
-                count += 1
-                indices = np.where(mean_runtime_array == mean_runtime_array.min())[0]
-
-            performance[ins_index]['label'] = indices[0] + 1
+        performance['id'] = result['ins_names']
+        runtime = np.round(result['par'].astype(np.float32), 3)
+        mean_runtime = np.round(result['mean'].astype(np.float32), 3)
+        for alg_index in range(self.alg_num):
+            performance['runtime_%d' % (alg_index+1)] = runtime[:, alg_index]
+            performance['status_%d' % (alg_index+1)] = np.where(result['timeout'][:, alg_index],
+                                                                'timeout', 'ok')
+
+        # the best rounded PAR10 runtime, ties are broken by the mean runtime of all algorithms
+        tie = np.sum(runtime == runtime.min(axis=1, keepdims=True), axis=1) > 1
+        count = np.sum(tie)
+        label = np.where(tie, np.argmin(mean_runtime, axis=1), np.argmin(runtime, axis=1))
+        performance['label'] = label + 1
         print('count %d' % count)
         np.save('%slabels.npy' % out_dir, performance)
 
@@ -91,39 +82,23 @@ class create_labels(object):
         self.method = method
 
     def __call__(self):
-        # directly handle *_algorithm_runs.npy
-        # out_dir = '../data/TSP/runs/'
-        # result_files = glob('%s*_algorithm_runs*' % out_dir)
-        result_files = ['../data/TSP/runs/RUE_algorithm_runs.npy',
-                        '../data/TSP/runs/explosion_algorithm_runs.npy',
-                        '../data/TSP/runs/grid_algorithm_runs.npy',
-                        '../data/TSP/runs/cluster_algorithm_runs.npy',
-                        '../data/TSP/runs/implosion_algorithm_runs.npy',
-                        '../data/TSP/runs/expansion_algorithm_runs.npy']
-        w = np.zeros((0, self.rep_run, self.alg_num),
-                     dtype=[('alg', 'S20'),
-                            ('ins_name', 'S100'), ('runtime', 'f8'),
-                            ('quality', 'f8'), ('status', 'S10')
-                            ])
-        for result in result_files:
-            pm = np.load(open(result, 'rb'))
-            w = np.vstack((w, pm))
-        print('Whole instance number', w.shape[0])
-
-        w['runtime'][w['status'] == b'TIMEOUT'] = self.t_max * self.pel
+        # directly handle the performance tensor written by gather_data/algorithm_runs.py
+        perf = PerformanceTensor.open('../data/TSP/runs/performance')
+        families = ['RUE', 'explosion', 'grid', 'cluster', 'implosion', 'expansion']
+        ins_index = perf.family_index(families)
+        ins_names = [perf.ins_names[i] for i in ins_index]
+        ins_num = ins_index.shape[0]
+        print('Whole instance number', ins_num)
+
+        # runtime: shape(ins_num, repeat, alg_num)
+        runtime = perf.runtime[ins_index].astype(np.float64)
+        runtime[perf.status_mask(['TIMEOUT'], ins_index)] = self.t_max * self.pel
 
         # t(runtime of each algorithm for each ins): shape(ins_num, alg_num)
-        t = np.median(np.round(w['runtime'], 2), axis=1)
+        t = np.median(np.round(runtime, 2), axis=1)
 
         # X(features): shape(ins_num, feature_num)
-        df = pd.read_csv('../data/TSP/all_feature_values.csv')
-        X = np.zeros((w.shape[0], df.shape[1]-1))
-        name_index_dict = dict()
-        for index in range(w.shape[0]):
-            if index == w.shape[0] - 1:
-                print(" ")
-            X[index, ] = df[df['name'] == w[index, 0, 0]['ins_name'].decode("utf-8")].values[0, 1:]
-            name_index_dict[w[index, 0, 0]['ins_name'].decode("utf-8")] = index
+        X = load_features('../data/TSP/all_feature_values.csv').gather(ins_names)
 
         # train_index/test_index: shape(ins_num, )
         with open('../data/TSP/train_instance_id.txt', 'r') as f:
@@ -131,16 +106,13 @@ class create_labels(object):
         with open('../data/TSP/test_instance_id.txt', 'r') as f:
             test_insts = f.read().strip().split('\n')
 
-        train_index = [name_index_dict[ins_name] for ins_name in train_insts]
-        test_index = [name_index_dict[ins_name] for ins_name in test_insts]
-        train_index = np.array(train_index)
-        test_index = np.array(test_index)
+        name_index = pd.Index(ins_names)
+        train_index = name_index.get_indexer(train_insts)
+        test_index = name_index.get_indexer(test_insts)
+        assert (train_index >= 0).all() and (test_index >= 0).all()
 
         # z(feature cost): shape(ins_num, feature_type_num)
-        df = pd.read_csv('../data/TSP/all_feature_computation_time.csv')
-        z = np.zeros((w.shape[0], df.shape[1]-1))
-        for index in range(w.shape[0]):
-            z[index, ] = df[df['name'] == w[index, 0, 0]['ins_name'].decode("utf-8")].values[0, 1:]
+        z = load_features('../data/TSP/all_feature_computation_time.csv').gather(ins_names)
 
         if self.method == 'regression':
             # y: shape(ins_num, alg_num)
@@ -148,7 +120,7 @@ class create_labels(object):
 
         # labels: shape(ins_num, )
         count = 0
-        labels = np.zeros(w.shape[0], dtype=int)
+        labels = np.zeros(ins_num, dtype=int)
         for index, line in enumerate(t):
             min_value = np.min(line)
             min_L = []
@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import numpy as np
+import torch
+from torch.nn import Linear
+from torch_geometric.nn.conv import NNConv
+from mpnn.layers import CGConv, FactorizedCGConv, ChunkedNNConv
+
+
+"""
+step time and memory of the graph convolutions of mpnn.layers against their reference layers
+"""
+
+
+def saved_tensor_bytes(func):
+    """
+    bytes of the tensors autograd saves for backward during func(), the activation memory of a step
+    """
+    total = [0]
+
+    def pack(tensor):
+        total[0] += tensor.numel() * tensor.element_size()
+        return tensor
+
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+        output = func()
+    return output, total[0]
+
+
+def benchmark(sizes = (1000, 5000, 20000), k = 32, channels = 64, repeat = 3):
+    """
+    step time (ms, forward and backward) and activation memory (MB) of CGConv vs FactorizedCGConv
+    on kNN graphs with k neighbours, and the peak CUDA memory when a GPU is available
+    """
+    from tsp.graph import knn_graph
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    columns = ['E', 'ms', 'fact ms', 'MB', 'fact MB'] + (['peak MB', 'fact peak MB'] if device.type == 'cuda' else [])
+    print("{:>8} ".format('N') + " ".join("{:>12}".format(column) for column in columns))
+    rng = np.random.RandomState(0)
+    for n in sizes:
+        edge_index, edge_attr = knn_graph(rng.rand(n, 2), k)
+        edge_index = torch.from_numpy(edge_index).long().to(device)
+        edge_attr = torch.from_numpy(edge_attr).to(device)
+        x = torch.randn(n, channels, device=device)
+        conv = CGConv(channels, 1, aggr='mean').to(device)
+        factorized = FactorizedCGConv(channels, 1, aggr='mean').to(device)
+        factorized.load_state_dict(conv.state_dict())
+        assert torch.allclose(conv(x, edge_index, edge_attr), factorized(x, edge_index, edge_attr), atol=1e-5)
+
+        times, memory, peaks = [], [], []
+        for layer in [conv, factorized]:
+            if device.type == 'cuda':
+                torch.cuda.synchronize()
+                torch.cuda.reset_peak_memory_stats()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                out, saved = saved_tensor_bytes(lambda: layer(x, edge_index, edge_attr))
+                out.sum().backward()
+            if device.type == 'cuda':
+                torch.cuda.synchronize()
+                peaks.append(torch.cuda.max_memory_allocated() / 1e6)
+            times.append((time.perf_counter() - start) / repeat * 1000)
+            memory.append(saved / 1e6)
+        values = times + memory + peaks
+        print("{:>8} {:>12} ".format(n, edge_index.shape[1]) + " ".join("{:>12.2f}".format(value) for value in values))
+
+
+def run_forked(func):
+    """
+    (func(), bytes of the peak resident memory added by func()) in a forked process, whose high-water mark
+    starts at the current resident size, or None if the process dies (e.g. killed out of memory)
+    """
+    import resource
+    from multiprocessing import get_context
+    from queue import Empty
+
+    def resident():
+        with open('/proc/self/statm', 'r') as in_file:
+            return int(in_file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    def run(queue):
+        before = resident()
+        result = func()
+        queue.put((result, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - before))
+
+    context = get_context('fork')
+    queue = context.Queue()
+    process = context.Process(target=run, args=(queue, ))
+    process.start()
+    result = None
+    while result is None and (process.is_alive() or not queue.empty()):
+        try:
+            result = queue.get(timeout=1)
+        except Empty:
+            pass
+    process.join()
+    return result
+
+
+def benchmark_nnconv(sizes = (1000, 5000, 20000), k = 32, in_ch = 32, out_ch = 32, max_bytes = 1 << 26, repeat = 3):
+    """
+    step time (ms, forward and backward), activation memory (MB) and peak memory of the steps (MB, Linux)
+    of NNConv vs ChunkedNNConv on kNN graphs with k neighbours, x requires grad as in the second layer,
+    '-' if the layer runs out of memory
+    """
+    from tsp.graph import knn_graph
+    columns = ['E', 'ms', 'chunked ms', 'MB', 'chunked MB', 'peak MB', 'chunked peak']
+    print("{:>8} ".format('N') + " ".join("{:>12}".format(column) for column in columns))
+    rng = np.random.RandomState(0)
+    for n in sizes:
+        edge_index, edge_attr = knn_graph(rng.rand(n, 2), k)
+        edge_index = torch.from_numpy(edge_index).long()
+        edge_attr = torch.from_numpy(edge_attr).view(-1, 1)
+        x = torch.randn(n, in_ch, requires_grad=True)
+        edge_nn = torch.nn.Sequential(Linear(1, 32), torch.nn.ReLU(), Linear(32, in_ch * out_ch))
+        conv = NNConv(in_ch, out_ch, edge_nn, aggr='mean')
+        chunked = ChunkedNNConv(in_ch, out_ch, edge_nn, aggr='mean', max_bytes=max_bytes)
+        chunked.load_state_dict(conv.state_dict())
+
+        def step(layer):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                out, saved = saved_tensor_bytes(lambda: layer(x, edge_index, edge_attr))
+                out.sum().backward()
+            return (time.perf_counter() - start) / repeat * 1000, saved / 1e6, out.detach().numpy()
+
+        results = [run_forked(lambda: step(layer)) for layer in [conv, chunked]]
+        if results[0] is not None and results[1] is not None:
+            assert np.allclose(results[0][0][2], results[1][0][2], atol=1e-5)
+        values = [[result[0][0], result[0][1], result[1] / 1e6] if result is not None else [None] * 3
+                  for result in results]
+        values = [value for pair in zip(*values) for value in pair]
+        print("{:>8} {:>12} ".format(n, edge_index.shape[1]) + " ".join(
+            "{:>12}".format('-') if value is None else "{:>12.2f}".format(value) for value in values))
+
+
+if __name__ == "__main__":
+    # python -m mpnn.benchmark [k] [channels]
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    benchmark(k=k, channels=int(sys.argv[2]) if len(sys.argv) > 2 else 64)
+    benchmark_nnconv(k=k)
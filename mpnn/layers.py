@@ -7,7 +7,9 @@ import torch.nn.functional as F
 from torch.nn.parameter import Parameter
 from torch.nn import BatchNorm1d, Linear, BCEWithLogitsLoss, MSELoss
 from torch.nn.modules.module import Module
-from torch_geometric.nn.conv import MessagePassing
+from torch_geometric.nn.conv import MessagePassing, NNConv
+from torch.utils.checkpoint import checkpoint
+from torch_scatter import scatter_add
 class FC(Module):
     def __init__(self, in_ch, out_ch):
         super(FC, self).__init__()
@@ -132,3 +134,95 @@ class CGConv(MessagePassing):
         return '{}({}, {}, dim={})'.format(self.__class__.__name__,
                                            self.in_channels, self.out_channels,
                                            self.dim)
+
+
+
+class FactorizedCGConv(CGConv):
+    r"""CGConv with the message computed from per-node projections, the same parameters and outputs.
+
+    :math:`\mathbf{z}_{i,j} \mathbf{W} = \mathbf{x}_i \mathbf{W}^{(i)} + \mathbf{x}_j \mathbf{W}^{(j)}
+    + \mathbf{e}_{i,j} \mathbf{W}^{(e)}`, so the node terms of both gates are projected once per node
+    (N * 2C * 2C) and gathered per edge, only the D-dimensional edge term is computed per edge,
+    instead of two (2C + D) * C products and a (2C + D) concatenation per edge.
+    """
+    def project(self, lin, x):
+        """
+        (x W_i + b, x W_j, W_e) of one gate
+        """
+        channels = self.in_channels
+        weight = lin.weight
+        return F.linear(x, weight[:, :channels], lin.bias), F.linear(x, weight[:, channels: 2 * channels]), \
+            weight[:, 2 * channels:]
+
+    def forward(self, x, edge_index, edge_attr):
+        """"""
+        # the bias is added once per node instead of once per edge
+        f_i, f_j, weight_f = self.project(self.lin_f, x)
+        s_i, s_j, weight_s = self.project(self.lin_s, x)
+        edge_attr = edge_attr.view((edge_attr.shape[0], 1)) if edge_attr.dim() == 1 else edge_attr
+        # (source, target) pairs: the _j terms are gathered at the sources and the _i terms at the targets
+        return self.propagate(edge_index, f=(f_j, f_i), s=(s_j, s_i), x=x, edge_attr=edge_attr,
+                              weight_f=weight_f, weight_s=weight_s)
+
+    def message(self, f_i, f_j, s_i, s_j, edge_attr, weight_f, weight_s):
+        # the edge term is accumulated by the (E, D) x (D, C) product, the gates stay separate tensors
+        # so that backward does not split and concatenate (E, 2C) gradients
+        f = torch.addmm(f_i + f_j, edge_attr, weight_f.t())
+        s = torch.addmm(s_i + s_j, edge_attr, weight_s.t())
+        return f.sigmoid() * F.softplus(s)
+
+
+class ChunkedNNConv(NNConv):
+    """
+    NNConv streaming the edges in chunks of at most max_bytes of per-edge weights (E * in * out),
+    the messages of every chunk are summed into the nodes with torch_scatter and the chunk is
+    recomputed in backward (checkpoint) instead of kept, so the memory of a layer is bounded by
+    max_bytes whatever the number of edges, with the parameters and outputs of NNConv
+    only the 'add' and 'mean' aggregations can be streamed
+    """
+    def __init__(self, in_channels, out_channels, nn, aggr = 'add', max_bytes = 1 << 28, **kwargs):
+        if aggr not in ['add', 'mean']:
+            raise ValueError("unknown aggregation {}, expect add or mean".format(aggr))
+        super(ChunkedNNConv, self).__init__(in_channels, out_channels, nn, aggr=aggr, **kwargs)
+        self.reduce = aggr
+        self.max_bytes = max_bytes
+
+    def chunk_edges(self, x):
+        # the (chunk, in, out) weights and the broadcast product of the messages
+        edge_bytes = 2 * self.in_channels_l * self.out_channels * x.element_size()
+        return int(max(1, self.max_bytes // edge_bytes))
+
+    def chunk_message(self, x, source, target, edge_attr):
+        """
+        (N, out) sum of the messages of the edges source -> target
+        """
+        weight = self.nn(edge_attr).view(-1, self.in_channels_l, self.out_channels)
+        message = torch.matmul(x.index_select(0, source).unsqueeze(1), weight).squeeze(1)
+        return scatter_add(message, target, dim=0, dim_size=x.shape[0])
+
+    def forward(self, x, edge_index, edge_attr, size = None):
+        """"""
+        num_edges = edge_index.shape[1]
+        step = self.chunk_edges(x)
+        recompute = torch.is_grad_enabled() and num_edges > step
+        out = None
+        for start in range(0, num_edges, step):
+            source, target = edge_index[0, start: start + step], edge_index[1, start: start + step]
+            chunk = (x, source, target, edge_attr[start: start + step])
+            if recompute:
+                chunk_out = checkpoint(self.chunk_message, *chunk, use_reentrant=False)
+            else:
+                chunk_out = self.chunk_message(*chunk)
+            out = chunk_out if out is None else out + chunk_out
+        if out is None:
+            out = x.new_zeros((x.shape[0], self.out_channels))
+        if self.reduce == 'mean':
+            count = scatter_add(torch.ones_like(edge_index[1], dtype=x.dtype), edge_index[1], dim=0,
+                                dim_size=x.shape[0])
+            out = out / count.clamp(min=1).unsqueeze(-1)
+
+        if self.root_weight:
+            out = out + self.lin(x)
+        if self.bias is not None:
+            out = out + self.bias
+        return out
@@ -1,7 +1,7 @@
 import torch.nn as nn
 import torch
 import torch.nn.functional as F
-from mpnn.layers import MLP, FC, BatchNorm, CGConv
+from mpnn.layers import MLP, FC, BatchNorm, CGConv, FactorizedCGConv, ChunkedNNConv
 from torch_scatter import scatter_mean
 from torch_geometric.nn import NNConv, global_mean_pool, global_sort_pool, GlobalAttention
 
@@ -10,7 +10,10 @@ from torch_geometric.nn import NNConv, global_mean_pool, global_sort_pool, Globa
 class MPNN(nn.Module):
     def __init__(self, in_ch, hid_ch, out_ch,
                  num_edge_feats, num_edge_hid, num_hid, num_classes,
-                 dropout, batch_norm = True):
+                 dropout, batch_norm = True, max_bytes = 1 << 28):
+        """
+        max_bytes: memory budget of the per-edge weights of a layer, the edges are processed in chunks within it
+        """
         super(MPNN, self).__init__()
         nn1 = nn.Sequential(nn.Linear(num_edge_feats, num_edge_hid),
                             nn.ReLU(),
@@ -22,8 +25,9 @@ class MPNN(nn.Module):
                             nn.Linear(num_edge_hid, hid_ch * out_ch))
         '''
 
-        self.nncov1 = NNConv(in_ch, hid_ch, nn1,  aggr='mean')
-        self.nncov2 = NNConv(hid_ch, out_ch, FC(num_edge_feats, hid_ch * out_ch), aggr= 'mean')
+        self.nncov1 = ChunkedNNConv(in_ch, hid_ch, nn1,  aggr='mean', max_bytes = max_bytes)
+        self.nncov2 = ChunkedNNConv(hid_ch, out_ch, FC(num_edge_feats, hid_ch * out_ch), aggr= 'mean',
+                                    max_bytes = max_bytes)
         self.mlp = MLP(out_ch, num_hid, num_classes)
         self.dropout = dropout
         self.batch_norm = batch_norm
@@ -56,10 +60,12 @@ class MPNN(nn.Module):
 class CGCNN(nn.Module):
     def __init__(self, in_ch,
                  num_edge_feats, num_hid, num_classes,
-                 dropout, batch_norm = True):
+                 dropout, batch_norm = True, factorized = True):
         super(CGCNN, self).__init__()
-        self.cgcov1 = CGConv(channels= in_ch, dim = num_edge_feats, aggr = 'mean')
-        self.cgcov2 = CGConv(channels= in_ch, dim = num_edge_feats, aggr = 'mean')
+        # the factorized layer has the same parameters and outputs, it only computes the messages faster
+        conv = FactorizedCGConv if factorized else CGConv
+        self.cgcov1 = conv(channels= in_ch, dim = num_edge_feats, aggr = 'mean')
+        self.cgcov2 = conv(channels= in_ch, dim = num_edge_feats, aggr = 'mean')
         self.mlp = MLP(in_ch, num_hid, num_classes)
         self.dropout = dropout
 
@@ -0,0 +1,215 @@
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+import os
+import sys
+import json
+import time
+import numpy as np
+from functools import partial
+from multiprocessing import Pool
+from util import coordinate_normalize, rot90_images, rotate_images, flip_images
+from store import CoordinateStore
+from store.runs import file_hash
+from tsp.graph import build_graph
+from tsp.distance import distance_matrix, complete_graph
+from tsp.tsplib import read_coordinates, find_tsp_files
+
+
+"""
+offline preprocessing of a tsp corpus, replacing the serial load_tsp_instance / savetoTSPImage /
+tsp_image_rotate / tsp_image_rotate_and_flip calls of util.py
+every instance gets one record <output>/<key>.npz holding all requested variants, and
+<output>/manifest.json maps key -> source hash and parameters, so a rerun only processes
+new or changed instances (or all of them when the parameters change)
+"""
+
+
+OUTPUTS = ['x', 'adj', 'edges', 'graph', 'rot90', 'rotate', 'flip']
+MANIFEST = 'manifest.json'
+
+
+def find_instances(sources):
+    """
+    key -> .tsp file, the key is the path relative to the source directory without extension,
+    or the file name for a source file
+    """
+    instances = {}
+    for source in sources:
+        if os.path.isfile(source):
+            instances[os.path.splitext(os.path.basename(source))[0]] = source
+            continue
+        instances.update(find_tsp_files(source))
+    return instances
+
+
+def file_stamp(filename):
+    stat = os.stat(filename)
+    return '{}:{}'.format(stat.st_size, stat.st_mtime_ns)
+
+
+def load_manifest(output):
+    manifest_file = os.path.join(output, MANIFEST)
+    if not os.path.isfile(manifest_file):
+        return {}
+    try:
+        with open(manifest_file, 'r') as in_file:
+            return json.load(in_file)
+    except ValueError:
+        return {}
+
+
+def save_manifest(output, manifest):
+    manifest_file = os.path.join(output, MANIFEST)
+    tmp_file = manifest_file + '.{}.tmp'.format(os.getpid())
+    with open(tmp_file, 'w') as out_file:
+        json.dump(manifest, out_file, indent=1, sort_keys=True)
+    os.replace(tmp_file, manifest_file)
+
+
+def record_file(output, key):
+    return os.path.join(output, key + '.npz')
+
+
+def load_record(output, key):
+    """
+    dictionary of the arrays of the record of key
+    """
+    with np.load(record_file(output, key)) as data:
+        return {name: data[name] for name in data.files}
+
+
+def build_record(x, params, max_bytes = 1 << 28):
+    """
+    the arrays of all requested variants of the (unnormalized) coordinates x
+    max_bytes: memory bound of the distance blocks, it does not change the arrays
+    """
+    x = coordinate_normalize(np.array(x, dtype=np.float32))
+    outputs, num_grid = params['outputs'], params['num_grid']
+    record = {'x': x}
+    if 'adj' in outputs:
+        record['adj'] = distance_matrix(x, max_bytes=max_bytes)
+    if 'edges' in outputs:
+        record['edge_index'], record['edge_attr'] = complete_graph(x, max_bytes=max_bytes)
+    if 'graph' in outputs:
+        record['graph_edge_index'], record['graph_edge_attr'] = build_graph(x, params['graph'], params['k'])
+    if 'rot90' in outputs:
+        record['rot90'] = rot90_images(x, num_grid)
+    if 'rotate' in outputs:
+        record['rotate'] = rotate_images(x, num_grid)
+    if 'flip' in outputs:
+        record['flip'] = flip_images(x, num_grid)
+    return record
+
+
+def process_instance(task, output, params, max_bytes = 1 << 28):
+    """
+    worker: hash the source and rebuild its record unless the manifest entry is still valid
+    :return: (key, manifest entry, # source bytes read, whether the record was rebuilt)
+    """
+    key, filename, entry = task
+    stamp = file_stamp(filename)
+    digest = file_hash(filename)
+    new_entry = {'source': os.path.abspath(filename), 'stamp': stamp, 'hash': digest, 'params': params}
+    if entry is not None and entry.get('hash') == digest and entry.get('params') == params and \
+            os.path.isfile(record_file(output, key)):
+        # touched but not changed
+        return key, new_entry, os.path.getsize(filename), False
+    record = build_record(read_coordinates(filename), params, max_bytes)
+    target = record_file(output, key)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # np.savez adds .npz to names without it
+    tmp_file = target + '.{}.tmp.npz'.format(os.getpid())
+    np.savez_compressed(tmp_file, **record)
+    os.replace(tmp_file, target)
+    return key, new_entry, os.path.getsize(filename), True
+
+
+def pack_records(output, manifest, filename):
+    """
+    pack the normalized coordinates of all records into one store.CoordinateStore file
+    """
+    keys = sorted(manifest)
+    arrays = []
+    for key in keys:
+        # only x is decompressed, not the other arrays of the record
+        with np.load(record_file(output, key)) as data:
+            arrays.append(data['x'])
+    CoordinateStore.from_arrays(keys, arrays).save(filename)
+
+
+def preprocess(args):
+    # the settings changing the records, a changed entry rebuilds them
+    params = {'outputs': sorted(args.outputs), 'num_grid': args.num_grid, 'graph': args.graph, 'k': args.k}
+    os.makedirs(args.output, exist_ok=True)
+    manifest = load_manifest(args.output)
+    instances = find_instances(args.sources)
+
+    tasks = []
+    for key, filename in sorted(instances.items()):
+        entry = manifest.get(key)
+        if entry is not None and entry.get('stamp') == file_stamp(filename) and entry.get('params') == params \
+                and os.path.isfile(record_file(args.output, key)):
+            continue
+        tasks.append((key, filename, entry))
+    print("{} instances, {} up to date, {} to check".format(len(instances), len(instances) - len(tasks), len(tasks)))
+
+    start = time.perf_counter()
+    num_processed, num_bytes = 0, 0
+    worker = partial(process_instance, output=args.output, params=params, max_bytes=args.max_bytes)
+    pool = Pool(args.workers) if args.workers > 1 else None
+    results = pool.imap_unordered(worker, tasks) if pool is not None else map(worker, tasks)
+    try:
+        for i, (key, entry, size, rebuilt) in enumerate(results):
+            manifest[key] = entry
+            num_processed += int(rebuilt)
+            num_bytes += size if rebuilt else 0
+            if args.verbose and rebuilt:
+                print("proceed: " + key)
+            if (i + 1) % args.save_every == 0:
+                save_manifest(args.output, manifest)
+    finally:
+        # keep the finished instances of an interrupted run
+        save_manifest(args.output, manifest)
+        if pool is not None:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - start
+
+    print("processed {} instances, skipped {} in {:.2f}s: {:.2f} instances/s, {:.2f} MB/s".format(
+        num_processed, len(instances) - num_processed, elapsed, num_processed / max(elapsed, 1e-9),
+        num_bytes / 1e6 / max(elapsed, 1e-9)))
+    if args.pack is not None:
+        pack_records(args.output, manifest, args.pack)
+        print("packed {} instances into {}".format(len(manifest), args.pack))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("preprocess", formatter_class=ArgumentDefaultsHelpFormatter, conflict_handler='resolve')
+    parser.add_argument("sources", nargs='+', type=str, help='.tsp files or directories searched recursively for them')
+    parser.add_argument("--output", type=str, required=True, help='directory of the records and the manifest')
+    parser.add_argument("--outputs", type=str, default='x,rot90,rotate,flip',
+                        help='comma separated variants of each record: ' + ', '.join(OUTPUTS) +
+                             ' (adj: distance matrix, edges: complete graph, graph: --graph sparse graph, '
+                             'rot90 / rotate / flip: density images of savetoTSPImage / tsp_image_rotate / '
+                             'tsp_image_rotate_and_flip)')
+    parser.add_argument("--num_grid", type=int, default=256, help='grid size of the images')
+    parser.add_argument("--graph", type=str, default='knn', help='sparse graph: knn or delaunay')
+    parser.add_argument("--k", type=int, default=8, help='# of neighbours of the knn graph')
+    parser.add_argument("--max_bytes", type=int, default=1 << 28, help='memory bound of the distance blocks')
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help='# of worker processes')
+    parser.add_argument("--save_every", type=int, default=100, help='# of instances between manifest saves')
+    parser.add_argument("--pack", type=str, default=None,
+                        help='also pack the normalized coordinates into this store.CoordinateStore file')
+    parser.add_argument("--verbose", action='store_true', default=False)
+    args = parser.parse_args()
+
+    args.outputs = [output.strip() for output in args.outputs.split(',') if output.strip()]
+    for output in args.outputs:
+        if output not in OUTPUTS:
+            print("unknown output {}, expect {}".format(output, ', '.join(OUTPUTS)))
+            sys.exit()
+    if 'x' not in args.outputs:
+        args.outputs.append('x')
+    if args.graph not in ['knn', 'delaunay']:
+        print("unknown graph {}, expect knn or delaunay".format(args.graph))
+        sys.exit()
+    preprocess(args)
@@ -0,0 +1,6 @@
+from .runs import RunTable, load_runs, parse_runs, read_runs_csv
+from .aggregate import RunAggregator, aggregate_runs, aggregate_performance, aggregate_runs_file, to_label_dict
+from .perf import PerformanceTensor, load_performance, structured_to_tensor, run_table_to_tensor
+from .features import FeatureStore, load_features
+from .coords import CoordinateStore, pack_zip, pack_directory
+from .reader import dump, load
@@ -0,0 +1,201 @@
+import numpy as np
+from store.runs import read_runs_csv, factorize
+
+
+class RunAggregator(object):
+    """
+    group algorithm runs by (instance, algorithm) and compute per-instance performance
+    runs can be added in chunks in any order, any number of repeats and algorithms is supported
+    the memory is bounded by (# instances, # algorithms, # repeats), not by the size of the run log
+    """
+    def __init__(self, t_max = 3600.0, penalize_factor = 10, ok_status = ('ok',),
+                 algorithm_names = None, dtype = np.float64):
+        """
+        :param t_max: cutoff time, runs with runtime >= t_max are timeouts
+        :param penalize_factor: a timeout costs t_max * penalize_factor (PAR10)
+        :param ok_status: values of the status column of successful runs, None to judge by runtime only
+        :param algorithm_names: fix the algorithm order, otherwise the order of first appearance
+        """
+        self.t_max = t_max
+        self.pel = penalize_factor
+        self.ok_status = None if ok_status is None else set(ok_status)
+        self.dtype = dtype
+        self.ins_names, self._ins_lookup = [], {}
+        self.algorithm_names = [] if algorithm_names is None else list(algorithm_names)
+        self._algorithm_lookup = {name: i for i, name in enumerate(self.algorithm_names)}
+        self.num_ins = 0
+        self.runtime = np.full((0, len(self.algorithm_names), 0), np.nan, dtype=dtype)
+        self.success = np.zeros((0, len(self.algorithm_names), 0), dtype=np.bool_)
+        self.count = np.zeros((0, len(self.algorithm_names)), dtype=np.int32)
+
+    def _reserve(self, num_ins, num_alg, num_rep):
+        cap_ins, cap_alg, cap_rep = self.runtime.shape
+        if num_ins <= cap_ins and num_alg <= cap_alg and num_rep <= cap_rep:
+            return
+        # grow the instance axis geometrically, chunks usually add a few instances each
+        shape = (max(cap_ins, num_ins, 2 * cap_ins if num_ins > cap_ins else 0),
+                 max(cap_alg, num_alg), max(cap_rep, num_rep))
+        runtime = np.full(shape, np.nan, dtype=self.dtype)
+        success = np.zeros(shape, dtype=np.bool_)
+        count = np.zeros(shape[:2], dtype=np.int32)
+        runtime[:cap_ins, :cap_alg, :cap_rep] = self.runtime
+        success[:cap_ins, :cap_alg, :cap_rep] = self.success
+        count[:cap_ins, :cap_alg] = self.count
+        self.runtime, self.success, self.count = runtime, success, count
+
+    def add(self, ins_id, algorithm, runtime, success):
+        """
+        add a chunk of runs
+        :param ins_id: integer codes into self.ins_names
+        :param algorithm: integer codes into self.algorithm_names
+        :param runtime: runtime of each run
+        :param success: bool, whether the run finished successfully
+        """
+        if len(runtime) == 0:
+            return
+        ins_id, algorithm = np.asarray(ins_id, dtype=np.int64), np.asarray(algorithm, dtype=np.int64)
+        self.num_ins = max(self.num_ins, int(ins_id.max()) + 1)
+        self._reserve(self.num_ins, max(len(self.algorithm_names), int(algorithm.max()) + 1), 0)
+        num_alg = self.count.shape[1]
+
+        # slot of each run inside its group = # runs of the group seen so far + rank in this chunk
+        group = ins_id * num_alg + algorithm
+        order = np.argsort(group, kind='stable')
+        group = group[order]
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        sizes = np.diff(np.r_[starts, group.shape[0]])
+        rank = np.arange(group.shape[0]) - np.repeat(starts, sizes)
+        slot = self.count.reshape(-1)[group] + rank
+        self._reserve(self.num_ins, num_alg, int(slot.max()) + 1)
+
+        num_rep = self.runtime.shape[2]
+        self.runtime.reshape(-1, num_rep)[group, slot] = np.asarray(runtime)[order]
+        self.success.reshape(-1, num_rep)[group, slot] = np.asarray(success)[order]
+        self.count.reshape(-1)[group[starts]] += sizes.astype(np.int32)
+
+    def add_frame(self, df):
+        """
+        add a chunk of runs given as a DataFrame with the columns of store.runs.RUN_COLUMNS
+        """
+        ins_id, _ = factorize(df['ins_id'].values, self.ins_names, self._ins_lookup)
+        algorithm, _ = factorize(df['algorithm'].values, self.algorithm_names, self._algorithm_lookup)
+        runtime = df['runtime'].values
+        success = runtime < self.t_max
+        if self.ok_status is not None:
+            success &= df['status'].str.strip().isin(self.ok_status).values
+        self.add(ins_id, algorithm, runtime, success)
+
+    def add_table(self, runs, chunksize = 1 << 22):
+        """
+        add all runs of a store.runs.RunTable, chunksize rows at a time
+        """
+        ins_map, _ = factorize(runs.ins_names, self.ins_names, self._ins_lookup)
+        algorithm_map, _ = factorize(runs.algorithm_names, self.algorithm_names, self._algorithm_lookup)
+        ok = np.array([self.ok_status is None or name in self.ok_status for name in runs.status_names],
+                      dtype=np.bool_)
+        for start in range(0, len(runs), chunksize):
+            end = start + chunksize
+            runtime = np.asarray(runs['runtime'][start: end])
+            success = (runtime < self.t_max) & ok[runs['status'][start: end]]
+            self.add(ins_map[runs['ins_id'][start: end]], algorithm_map[runs['algorithm'][start: end]],
+                     runtime, success)
+
+    def add_tensor(self, perf, chunksize = 1 << 16):
+        """
+        add all runs of a store.perf.PerformanceTensor, chunksize instances at a time
+        """
+        ins_map, _ = factorize(perf.ins_names, self.ins_names, self._ins_lookup)
+        algorithm_map, _ = factorize(perf.algorithm_names, self.algorithm_names, self._algorithm_lookup)
+        # status code -1 (missing run) indexes the trailing False
+        ok = np.array([self.ok_status is None or name in self.ok_status for name in perf.status_names] + [False],
+                      dtype=np.bool_)
+        for start in range(0, len(perf), chunksize):
+            status = np.asarray(perf.status[start: start + chunksize])
+            runtime = np.asarray(perf.runtime[start: start + chunksize], dtype=self.dtype)
+            present = status >= 0
+            ins_id = np.broadcast_to(ins_map[start: start + status.shape[0], None, None], status.shape)[present]
+            algorithm = np.broadcast_to(algorithm_map[None, None, :], status.shape)[present]
+            runtime = runtime[present]
+            success = (runtime < self.t_max) & ok[status[present]]
+            self.add(ins_id, algorithm, runtime, success)
+
+    def result(self, tie_break = 'first'):
+        """
+        :param tie_break: 'first' picks the first best algorithm, 'mean' breaks ties of the PAR10
+                          median by the mean runtime
+        :return: dictionary of arrays
+            ins_names (I,), algorithm_names (A,)
+            count (I, A): # of runs
+            median (I, A), mean (I, A): of the recorded runtime
+            timeout (I, A): the majority of runs did not finish
+            par (I, A): median runtime, t_max * penalize_factor on timeout
+            label (I,): index of the best algorithm, -1 if all algorithms time out
+        """
+        num_ins, num_alg = self.num_ins, len(self.algorithm_names)
+        runtime = self.runtime[:num_ins, :num_alg]
+        count = self.count[:num_ins, :num_alg]
+        num_success = self.success[:num_ins, :num_alg].sum(axis=2)
+
+        with np.errstate(invalid='ignore'):
+            median = np.nanmedian(runtime, axis=2) if runtime.shape[2] > 0 else \
+                np.full((num_ins, num_alg), np.nan)
+            mean = np.nanmean(runtime, axis=2) if runtime.shape[2] > 0 else \
+                np.full((num_ins, num_alg), np.nan)
+        timeout = 2 * num_success <= count
+        par = np.where(timeout, self.t_max * self.pel, median)
+
+        best = par.min(axis=1) if num_alg > 0 else np.zeros((num_ins))
+        candidate = (par == best[:, None]) & ~timeout
+        if tie_break == 'mean':
+            candidate_mean = np.where(candidate, mean, np.inf)
+            candidate &= candidate_mean == candidate_mean.min(axis=1)[:, None]
+        label = np.where(candidate.any(axis=1), np.argmax(candidate, axis=1), -1)
+
+        return {'ins_names': list(self.ins_names),
+                'algorithm_names': list(self.algorithm_names),
+                'count': count, 'median': median, 'mean': mean,
+                'timeout': timeout, 'par': par, 'label': label}
+
+
+def aggregate_runs(runs, **kwargs):
+    """
+    aggregate a store.runs.RunTable
+    """
+    tie_break = kwargs.pop('tie_break', 'first')
+    aggregator = RunAggregator(**kwargs)
+    aggregator.add_table(runs)
+    return aggregator.result(tie_break)
+
+
+def aggregate_performance(perf, **kwargs):
+    """
+    aggregate a store.perf.PerformanceTensor
+    """
+    tie_break = kwargs.pop('tie_break', 'first')
+    aggregator = RunAggregator(**kwargs)
+    aggregator.add_tensor(perf)
+    return aggregator.result(tie_break)
+
+
+def aggregate_runs_file(filename, chunksize = 1 << 22, **kwargs):
+    """
+    aggregate a run file of any size, reading chunksize rows at a time
+    """
+    tie_break = kwargs.pop('tie_break', 'first')
+    aggregator = RunAggregator(**kwargs)
+    for df in read_runs_csv(filename, chunksize=chunksize):
+        aggregator.add_frame(df)
+    return aggregator.result(tie_break)
+
+
+def to_label_dict(result, default_algorithm = 'all'):
+    """
+    instance -> (best algorithm, {algorithm: PAR10 median runtime})
+    the format of train.load_labels
+    """
+    algorithm_names = result['algorithm_names']
+    labels = {}
+    for ins_name, label, par in zip(result['ins_names'], result['label'].tolist(), result['par'].tolist()):
+        best_algorithm = algorithm_names[label] if label >= 0 else default_algorithm
+        labels[ins_name] = (best_algorithm, dict(zip(algorithm_names, par)))
+    return labels
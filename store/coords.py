@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import pickle
+import struct
+import zipfile
+import numpy as np
+
+
+MAGIC = b'TSPCOORD'
+ALIGNMENT = 64
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def zip_member_offset(archive, member = None):
+    """
+    byte offset of the data of an uncompressed (ZIP_STORED) member inside archive,
+    the first .pack member if member is None
+    """
+    with zipfile.ZipFile(archive) as zf:
+        if member is None:
+            members = [info.filename for info in zf.infolist() if info.filename.endswith('.pack')]
+            if not members:
+                raise IOError("no .pack member in {}".format(archive))
+            member = members[0]
+        info = zf.getinfo(member)
+        if info.compress_type != zipfile.ZIP_STORED:
+            raise IOError("{} is compressed in {}, store it with zip -0".format(member, archive))
+    with open(archive, 'rb') as in_file:
+        # local file header: 30 bytes + file name + extra field
+        in_file.seek(info.header_offset)
+        header = in_file.read(30)
+        name_len, extra_len = struct.unpack('<HH', header[26:30])
+    return info.header_offset + 30 + name_len + extra_len
+
+
+class CoordinateStore(object):
+    """
+    coordinates of all instances packed in one file
+    header: MAGIC, uint64 length of the json header {keys, num, total, offsets_start, coords_start}
+    offsets: int64 (num + 1), instance i owns the rows offsets[i]: offsets[i + 1] of coords (CSR style)
+    coords: float32 (total, 2)
+    the file (or an uncompressed .pack member of a zip archive) is memory-mapped, pickling a store only
+    pickles its file name, so DataLoader workers share the page cache instead of copying the arrays
+    """
+    def __init__(self, filename = None, keys = None, offsets = None, coords = None):
+        self.filename = filename
+        if filename is not None:
+            self._open()
+        else:
+            self.keys, self.offsets, self.coords = list(keys), offsets, coords
+        self._index = {key: i for i, key in enumerate(self.keys)}
+
+    def _open(self):
+        base = zip_member_offset(self.filename) if self.filename.endswith('.zip') else 0
+        with open(self.filename, 'rb') as in_file:
+            in_file.seek(base)
+            magic, header_len = in_file.read(len(MAGIC)), struct.unpack('<Q', in_file.read(8))[0]
+            if magic != MAGIC:
+                raise IOError("{} is not a packed coordinate file".format(self.filename))
+            header = json.loads(in_file.read(header_len).decode('utf-8'))
+        self.keys = header['keys']
+        self.offsets = np.memmap(self.filename, dtype=np.int64, mode='r',
+                                 offset=base + header['offsets_start'], shape=(header['num'] + 1,))
+        self.coords = np.memmap(self.filename, dtype=np.float32, mode='r',
+                                offset=base + header['coords_start'], shape=(header['total'], 2))
+
+    def __getstate__(self):
+        if self.filename is None:
+            return self.__dict__
+        return {'filename': self.filename}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if 'coords' not in state:
+            self._open()
+            self._index = {key: i for i, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, i):
+        """
+        (N, 2) coordinates of the i-th instance, a view into the packed buffer
+        """
+        return self.coords[self.offsets[i]: self.offsets[i + 1]]
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def index(self, keys):
+        return np.array([self._index[key] for key in keys], dtype=np.int64)
+
+    def get(self, key):
+        return self[self._index[key]]
+
+    def sizes(self):
+        return np.diff(self.offsets)
+
+    @staticmethod
+    def from_arrays(keys, arrays):
+        """
+        in-memory store of the (N, 2) arrays
+        """
+        sizes = np.array([x.shape[0] for x in arrays], dtype=np.int64)
+        offsets = np.zeros(shape=(len(arrays) + 1), dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        coords = np.concatenate([np.asarray(x, dtype=np.float32).reshape(-1, 2) for x in arrays]) \
+            if arrays else np.zeros((0, 2), dtype=np.float32)
+        return CoordinateStore(keys=keys, offsets=offsets, coords=coords)
+
+    def save(self, filename):
+        header = {'keys': list(self.keys), 'num': len(self.keys), 'total': int(self.offsets[-1])}
+        # the offsets depend on the header length, which depends on the offsets
+        header['offsets_start'] = header['coords_start'] = 0
+        while True:
+            header_bytes = json.dumps(header).encode('utf-8')
+            offsets_start = _align(len(MAGIC) + 8 + len(header_bytes))
+            coords_start = _align(offsets_start + 8 * (len(self.keys) + 1))
+            if (offsets_start, coords_start) == (header['offsets_start'], header['coords_start']):
+                break
+            header['offsets_start'], header['coords_start'] = offsets_start, coords_start
+        tmp_file = filename + '.{}.tmp'.format(os.getpid())
+        with open(tmp_file, 'wb') as out_file:
+            out_file.write(MAGIC)
+            out_file.write(struct.pack('<Q', len(header_bytes)))
+            out_file.write(header_bytes)
+            out_file.write(b'\0' * (offsets_start - out_file.tell()))
+            out_file.write(np.ascontiguousarray(self.offsets, dtype=np.int64).tobytes())
+            out_file.write(b'\0' * (coords_start - out_file.tell()))
+            out_file.write(np.ascontiguousarray(self.coords, dtype=np.float32).tobytes())
+        os.replace(tmp_file, filename)
+
+
+def pack_zip(archive, filename, suffix = '.coo.pickle'):
+    """
+    pack every <dataset>/<instance><suffix> member of archive into filename without extracting it,
+    the key of an instance is '<dataset>/<instance>'
+    """
+    keys, arrays = [], []
+    with zipfile.ZipFile(archive) as zf:
+        for name in sorted(zf.namelist()):
+            if not name.endswith(suffix):
+                continue
+            with zf.open(name) as in_file:
+                arrays.append(pickle.load(in_file)['x'])
+            keys.append('/'.join(name[:-len(suffix)].split('/')[-2:]))
+    CoordinateStore.from_arrays(keys, arrays).save(filename)
+    return len(keys)
+
+
+def pack_directory(path, filename, suffix = '.coo.pickle'):
+    """
+    pack every <path>/<dataset>/<instance><suffix> file into filename
+    """
+    keys, arrays = [], []
+    for dataset in sorted(os.listdir(path)):
+        if not os.path.isdir(os.path.join(path, dataset)):
+            continue
+        for name in sorted(os.listdir(os.path.join(path, dataset))):
+            if not name.endswith(suffix):
+                continue
+            with open(os.path.join(path, dataset, name), 'rb') as in_file:
+                arrays.append(pickle.load(in_file)['x'])
+            keys.append(dataset + '/' + name[:-len(suffix)])
+    CoordinateStore.from_arrays(keys, arrays).save(filename)
+    return len(keys)
+
+
+if __name__ == "__main__":
+    # python -m store.coords ECJ_instances_coo.zip ECJ_instances_coo.pack
+    source, target = sys.argv[1], sys.argv[2]
+    num = pack_zip(source, target) if source.endswith('.zip') else pack_directory(source, target)
+    print("packed {} instances into {}".format(num, target))
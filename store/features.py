@@ -0,0 +1,84 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from store.runs import build_cache
+
+
+class FeatureStore(object):
+    """
+    table of instance features keyed by instance name
+    path/values.npy: float64 (# columns, # instances), one contiguous row per feature column,
+    so a column range is a contiguous block of the memory map
+    path/meta.json: instance names and column names
+    """
+    def __init__(self, values, names, columns):
+        self.values = values
+        self.names = names
+        self.columns = columns
+        # hash index of instance name -> row
+        self._index = pd.Index(names)
+        self._column_index = {column: i for i, column in enumerate(columns)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def index(self, names):
+        """
+        hash join of names against the store, returns the row of each name
+        """
+        rows = self._index.get_indexer(pd.Index(names))
+        if (rows < 0).any():
+            missing = [name for name, row in zip(names, rows) if row < 0]
+            raise KeyError("instances without features: {}".format(missing[:5]))
+        return rows
+
+    def column_slice(self, columns):
+        """
+        columns: None (all), (start, end) position range as feature_index_dict, or a list of column names
+        """
+        if columns is None:
+            return slice(0, len(self.columns))
+        if isinstance(columns, tuple):
+            return slice(columns[0], columns[1])
+        return [self._column_index[column] for column in columns]
+
+    def gather(self, names, columns = None):
+        """
+        (# names, # selected columns) features of the instances names
+        """
+        rows = self.index(names)
+        return np.ascontiguousarray(self.values[self.column_slice(columns)][:, rows].T)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'values.npy'), np.ascontiguousarray(self.values))
+        with open(os.path.join(path, 'meta.json'), 'w') as out_file:
+            json.dump({'names': list(self.names), 'columns': list(self.columns)}, out_file)
+
+    @staticmethod
+    def load(path, mmap_mode = 'r'):
+        with open(os.path.join(path, 'meta.json'), 'r') as in_file:
+            meta = json.load(in_file)
+        values = np.load(os.path.join(path, 'values.npy'), mmap_mode=mmap_mode)
+        return FeatureStore(values, meta['names'], meta['columns'])
+
+    @staticmethod
+    def from_csv(filename, key = 'name'):
+        """
+        feature csv with the instance name in column key and numeric features in the others
+        """
+        df = pd.read_csv(filename)
+        columns = [column for column in df.columns if column != key]
+        values = df[columns].values.astype(np.float64).T
+        return FeatureStore(values, df[key].astype(str).tolist(), columns)
+
+
+def load_features(filename, cache_dir = None):
+    """
+    load a feature csv (e.g. all_feature_values.csv, all_feature_computation_time.csv) as a
+    memory-mapped FeatureStore, cached in cache_dir/<sha1 of filename>/
+    """
+    cache_dir = os.path.splitext(filename)[0] + '_cache' if cache_dir is None else cache_dir
+    path = build_cache(filename, cache_dir, lambda tmp_path: FeatureStore.from_csv(filename).save(tmp_path))
+    return FeatureStore.load(path)
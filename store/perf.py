@@ -0,0 +1,174 @@
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+from store.runs import load_runs, factorize
+
+
+class PerformanceTensor(object):
+    """
+    on-disk performance tensor of algorithm runs
+    path/runtime.f32: float32 (# instances, # repeats, # algorithms), NaN for missing runs
+    path/status.i8: int8 (# instances, # repeats, # algorithms), codes into status_names, -1 for missing runs
+    path/meta.json: shape and string dictionaries (instances, algorithms, status, instance families)
+    both binary files are raw C-order buffers, new instances are appended at the end of the files
+    and opened with np.memmap, so readers never copy the whole tensor
+    """
+    def __init__(self, path, mode = 'r'):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r') as in_file:
+            meta = json.load(in_file)
+        self.ins_names = meta['ins_names']
+        self.algorithm_names = meta['algorithm_names']
+        self.status_names = meta['status_names']
+        self.num_repeat = meta['num_repeat']
+        # family -> [start, end) instance range
+        self.families = {name: (start, end) for name, start, end in meta['families']}
+        self.family_order = [name for name, _, _ in meta['families']]
+        shape = (len(self.ins_names), self.num_repeat, len(self.algorithm_names))
+        if shape[0] > 0:
+            self.runtime = np.memmap(os.path.join(path, 'runtime.f32'), dtype=np.float32, mode=mode, shape=shape)
+            self.status = np.memmap(os.path.join(path, 'status.i8'), dtype=np.int8, mode=mode, shape=shape)
+        else:
+            self.runtime = np.zeros(shape, dtype=np.float32)
+            self.status = np.zeros(shape, dtype=np.int8)
+        self._ins_lookup = {name: i for i, name in enumerate(self.ins_names)}
+
+    def __len__(self):
+        return len(self.ins_names)
+
+    @staticmethod
+    def create(path, algorithm_names, num_repeat, status_names = ()):
+        os.makedirs(path, exist_ok=True)
+        for filename in ['runtime.f32', 'status.i8']:
+            open(os.path.join(path, filename), 'wb').close()
+        meta = {'ins_names': [], 'algorithm_names': list(algorithm_names),
+                'status_names': list(status_names), 'num_repeat': int(num_repeat), 'families': []}
+        with open(os.path.join(path, 'meta.json'), 'w') as out_file:
+            json.dump(meta, out_file)
+        return PerformanceTensor(path)
+
+    @staticmethod
+    def open(path, algorithm_names = None, num_repeat = None):
+        """
+        open an existing tensor, or create an empty one if algorithm_names and num_repeat are given
+        """
+        if not os.path.isfile(os.path.join(path, 'meta.json')):
+            if algorithm_names is None or num_repeat is None:
+                raise IOError("no performance tensor in {}".format(path))
+            return PerformanceTensor.create(path, algorithm_names, num_repeat)
+        return PerformanceTensor(path)
+
+    def index(self, ins_names):
+        """
+        instance names -> row indices
+        """
+        return np.array([self._ins_lookup[name] for name in ins_names], dtype=np.int64)
+
+    def family_index(self, families):
+        """
+        row indices of the instances of the given families, in the given order
+        """
+        return np.concatenate([np.arange(*self.families[family]) for family in families])
+
+    def append(self, ins_names, runtime, status, family = None):
+        """
+        append new instances without rewriting the existing data
+        :param ins_names: (n,) instance names
+        :param runtime: (n, # repeats, # algorithms) runtime
+        :param status: (n, # repeats, # algorithms) status strings (or bytes), or codes into status_names
+        :param family: name of the instance family (e.g. 'RUE', 'explosion')
+        """
+        ins_names = [name.decode('utf-8') if isinstance(name, bytes) else str(name) for name in ins_names]
+        runtime = np.ascontiguousarray(runtime, dtype=np.float32)
+        shape = (len(ins_names), self.num_repeat, len(self.algorithm_names))
+        assert runtime.shape == shape, "expect runtime of shape {}, got {}".format(shape, runtime.shape)
+        duplicated = [name for name in ins_names if name in self._ins_lookup]
+        assert not duplicated, "instances already in the tensor: {}".format(duplicated[:5])
+
+        status = np.asarray(status)
+        if status.dtype.kind in 'iu':
+            # already coded against self.status_names, -1 for missing runs
+            status_codes = status.astype(np.int8)
+        else:
+            if status.dtype.kind == 'S':
+                status = np.char.decode(status, 'utf-8')
+            status_codes, _ = factorize(status.reshape(-1), self.status_names)
+            assert len(self.status_names) < 128
+            status_codes = status_codes.astype(np.int8).reshape(shape)
+
+        with open(os.path.join(self.path, 'runtime.f32'), 'ab') as out_file:
+            out_file.write(runtime.tobytes())
+        with open(os.path.join(self.path, 'status.i8'), 'ab') as out_file:
+            out_file.write(status_codes.tobytes())
+
+        start = len(self.ins_names)
+        families = [[name, begin, end] for name, (begin, end) in
+                    ((name, self.families[name]) for name in self.family_order)]
+        if family is not None:
+            families.append([family, start, start + len(ins_names)])
+        meta = {'ins_names': self.ins_names + ins_names, 'algorithm_names': self.algorithm_names,
+                'status_names': self.status_names, 'num_repeat': self.num_repeat, 'families': families}
+        # the data is written before meta.json, readers only see complete instances
+        tmp_file = os.path.join(self.path, 'meta.json.{}.tmp'.format(os.getpid()))
+        with open(tmp_file, 'w') as out_file:
+            json.dump(meta, out_file)
+        os.replace(tmp_file, os.path.join(self.path, 'meta.json'))
+        self.__init__(self.path)
+
+    def status_mask(self, status_names, index = None):
+        """
+        bool mask (# instances, # repeats, # algorithms) of the runs whose status is in status_names
+        :param index: only for the instances of these row indices
+        """
+        codes = [i for i, name in enumerate(self.status_names) if name in status_names]
+        status = self.status if index is None else self.status[index]
+        return np.isin(status, codes)
+
+
+def structured_to_tensor(path, runs, family = None, algorithm_names = None):
+    """
+    append a gather_data structured array (# instances, # repeats, # algorithms) with the fields
+    alg, ins_name, runtime, quality, status to the tensor at path
+    """
+    if algorithm_names is None:
+        algorithm_names = [alg.decode('utf-8') for alg in runs[0, 0]['alg']]
+    perf = PerformanceTensor.open(path, algorithm_names, runs.shape[1])
+    perf.append(runs[:, 0, 0]['ins_name'], runs['runtime'], runs['status'], family)
+    return perf
+
+
+def run_table_to_tensor(path, runs):
+    """
+    write a store.runs.RunTable as a performance tensor, repeats are indexed by the repeat column
+    """
+    repeat_values, repeat = np.unique(np.asarray(runs['repeat']), return_inverse=True)
+    shape = (len(runs.ins_names), repeat_values.shape[0], len(runs.algorithm_names))
+    runtime = np.full(shape, np.nan, dtype=np.float32)
+    status = np.full(shape, -1, dtype=np.int8)
+    runtime[runs['ins_id'], repeat, runs['algorithm']] = runs['runtime']
+    status[runs['ins_id'], repeat, runs['algorithm']] = runs['status']
+    perf = PerformanceTensor.create(path, runs.algorithm_names, shape[1], runs.status_names)
+    perf.append(runs.ins_names, runtime, status)
+    return perf
+
+
+def load_performance(filename, cache_dir = None):
+    """
+    open the performance tensor at filename, or convert the arff run file filename
+    to a tensor stored next to its parsed columns (see store.runs.load_runs)
+    """
+    if os.path.isdir(filename):
+        return PerformanceTensor.open(filename)
+    runs = load_runs(filename, cache_dir)
+    path = os.path.join(runs.path, 'tensor')
+    if not os.path.isfile(os.path.join(path, 'meta.json')):
+        tmp_path = tempfile.mkdtemp(dir=runs.path)
+        run_table_to_tensor(tmp_path, runs)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # another process has finished the tensor first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    return PerformanceTensor.open(path)
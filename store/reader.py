@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import struct
+import pickle
+import numpy as np
+
+
+"""
+reader of the pickled instance files: pickle protocol 5 files whose arrays are stored out of band, so that loading a file is one read
+into a buffer the unpickled arrays point to, instead of a copy of every array out of the pickle stream
+"""
+
+
+MAGIC = b'PKL5OOB\0'
+ALIGNMENT = 64
+OUT_OF_BAND = pickle.HIGHEST_PROTOCOL >= 5
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def dump(obj, filename):
+    """
+    MAGIC, uint64 pickle length, uint64 # buffers, uint64 buffer lengths, pickle stream, then every
+    buffer aligned to ALIGNMENT bytes; a plain protocol 3 pickle on pythons without protocol 5
+    """
+    tmp_file = filename + '.{}.tmp'.format(os.getpid())
+    with open(tmp_file, 'wb') as out_file:
+        if not OUT_OF_BAND:
+            pickle.dump(obj, out_file, protocol=3)
+        else:
+            buffers = []
+            data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+            buffers = [buffer.raw() for buffer in buffers]
+            out_file.write(MAGIC)
+            out_file.write(struct.pack('<QQ', len(data), len(buffers)))
+            out_file.write(struct.pack('<{}Q'.format(len(buffers)), *[buffer.nbytes for buffer in buffers]))
+            out_file.write(data)
+            for buffer in buffers:
+                out_file.write(b'\0' * (_align(out_file.tell()) - out_file.tell()))
+                out_file.write(buffer)
+    os.replace(tmp_file, filename)
+
+
+def load(filename):
+    """
+    the object of a dump file (arrays are writable views into one buffer of the file), or of a plain pickle
+    """
+    # unbuffered read into an uninitialized array, a zeroed bytearray would touch every page twice
+    with open(filename, 'rb', buffering=0) as in_file:
+        content = np.empty(os.fstat(in_file.fileno()).st_size, dtype=np.uint8)
+        in_file.readinto(content)
+    view = memoryview(content)
+    if view[: len(MAGIC)] != MAGIC:
+        return pickle.loads(view)
+    offset = len(MAGIC)
+    data_len, num_buffers = struct.unpack_from('<QQ', view, offset)
+    offset += 16
+    sizes = struct.unpack_from('<{}Q'.format(num_buffers), view, offset)
+    offset += 8 * num_buffers
+    data = view[offset: offset + data_len]
+    offset += data_len
+    buffers = []
+    for size in sizes:
+        offset = _align(offset)
+        buffers.append(view[offset: offset + size])
+        offset += size
+    return pickle.loads(data, buffers=buffers)
+
+
+def benchmark(path, num_files = 64, num_grid = 256, repeat = 3):
+    """
+    time (ms) per file of reading num_files (num_grid, num_grid) images saved with pickle protocol 3 and with dump
+    """
+    rng = np.random.RandomState(0)
+    images = [rng.rand(num_grid, num_grid).astype(np.float32) for _ in range(num_files)]
+    legacy_files = [os.path.join(path, 'legacy{}.pickle'.format(i)) for i in range(num_files)]
+    files = [os.path.join(path, 'oob{}.pickle'.format(i)) for i in range(num_files)]
+    for image, legacy_file, filename in zip(images, legacy_files, files):
+        with open(legacy_file, 'wb') as out_file:
+            pickle.dump({'adj': image}, out_file, protocol=3)
+        dump({'adj': image}, filename)
+
+    def read_legacy():
+        for filename in legacy_files:
+            with open(filename, 'rb') as in_file:
+                pickle.load(in_file)
+
+    def read_oob():
+        for filename in files:
+            load(filename)
+
+    print("{:>10} {:>12} {:>12}".format('num_grid', 'pickle', 'load'))
+    times = []
+    for func in [read_legacy, read_oob]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        times.append((time.perf_counter() - start) / repeat / num_files * 1000)
+    print("{:>10} ".format(num_grid) + " ".join("{:>12.3f}".format(t) for t in times))
+    for filename in legacy_files + files:
+        os.remove(filename)
+
+
+if __name__ == "__main__":
+    # python -m store.reader directory [num_grid]
+    benchmark(sys.argv[1], num_grid=int(sys.argv[2]) if len(sys.argv) > 2 else 256)
@@ -0,0 +1,185 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+
+
+RUN_COLUMNS = ['ins_id', 'repeat', 'algorithm', 'runtime', 'status']
+
+
+def file_hash(filename, block_size = 1 << 20):
+    """
+    sha1 digest of the content of filename
+    """
+    sha = hashlib.sha1()
+    with open(filename, 'rb') as in_file:
+        for block in iter(lambda: in_file.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def count_header_lines(filename):
+    """
+    number of lines before the first data row of an arff file (up to and including '@data')
+    """
+    num_lines = 0
+    with open(filename, 'r') as in_file:
+        for line in in_file:
+            num_lines += 1
+            if line.strip().lower().startswith('@data'):
+                return num_lines
+    # plain csv without arff header
+    return 0
+
+
+def read_runs_csv(filename, chunksize = None):
+    """
+    vectorized reader of the algorithm runs file
+    :param chunksize: if not None, return an iterator of DataFrames with chunksize rows
+    """
+    return pd.read_csv(filename, skiprows=count_header_lines(filename), header=None,
+                       names=RUN_COLUMNS, usecols=range(len(RUN_COLUMNS)),
+                       comment='%', skipinitialspace=True, quotechar="'",
+                       dtype={'ins_id': str, 'repeat': np.int32, 'algorithm': str,
+                              'runtime': np.float64, 'status': str},
+                       chunksize=chunksize)
+
+
+def factorize(values, names = None, lookup = None):
+    """
+    integer-code the string column values, extending the dictionary names (and its inverse lookup) in place
+    """
+    names = [] if names is None else names
+    lookup = {name: i for i, name in enumerate(names)} if lookup is None else lookup
+    codes, uniques = pd.factorize(pd.Series(values).str.strip())
+    mapping = np.zeros(shape=(len(uniques)), dtype=np.int32)
+    for i, name in enumerate(uniques):
+        if name not in lookup:
+            lookup[name] = len(names)
+            names.append(name)
+        mapping[i] = lookup[name]
+    return mapping[codes], names
+
+
+class RunTable(object):
+    """
+    columnar table of algorithm runs, string columns are integer coded
+    ins_id (int32), repeat (int32), algorithm (int32), runtime (float64), status (int32)
+    """
+    def __init__(self, columns, ins_names, algorithm_names, status_names, path = None):
+        self.columns = columns
+        self.path = path
+        self.ins_names = ins_names
+        self.algorithm_names = algorithm_names
+        self.status_names = status_names
+
+    def __len__(self):
+        return self.columns['runtime'].shape[0]
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def records(self, start = 0, end = None):
+        """
+        rows [start, end) as (ins_id, repeat, algorithm, runtime, runstatus) tuples
+        """
+        end = len(self) if end is None else end
+        ins_names = np.asarray(self.ins_names, dtype=object)
+        algorithm_names = np.asarray(self.algorithm_names, dtype=object)
+        status_names = np.asarray(self.status_names, dtype=object)
+        return list(zip(ins_names[self.columns['ins_id'][start: end]].tolist(),
+                        self.columns['repeat'][start: end].tolist(),
+                        algorithm_names[self.columns['algorithm'][start: end]].tolist(),
+                        self.columns['runtime'][start: end].tolist(),
+                        status_names[self.columns['status'][start: end]].tolist()))
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for column in RUN_COLUMNS:
+            np.save(os.path.join(path, column + '.npy'), self.columns[column])
+        meta = {'num_rows': len(self),
+                'ins_names': self.ins_names,
+                'algorithm_names': self.algorithm_names,
+                'status_names': self.status_names}
+        with open(os.path.join(path, 'meta.json'), 'w') as out_file:
+            json.dump(meta, out_file)
+
+    @staticmethod
+    def load(path, mmap_mode = 'r'):
+        with open(os.path.join(path, 'meta.json'), 'r') as in_file:
+            meta = json.load(in_file)
+        columns = {column: np.load(os.path.join(path, column + '.npy'), mmap_mode=mmap_mode)
+                   for column in RUN_COLUMNS}
+        return RunTable(columns, meta['ins_names'], meta['algorithm_names'], meta['status_names'], path)
+
+
+def parse_runs(filename):
+    """
+    parse the whole runs file into a RunTable in one vectorized pass
+    """
+    df = read_runs_csv(filename)
+    ins_id, ins_names = factorize(df['ins_id'].values)
+    algorithm, algorithm_names = factorize(df['algorithm'].values)
+    status, status_names = factorize(df['status'].values)
+    columns = {'ins_id': ins_id,
+               'repeat': df['repeat'].values.astype(np.int32),
+               'algorithm': algorithm,
+               'runtime': df['runtime'].values.astype(np.float64),
+               'status': status}
+    return RunTable(columns, ins_names, algorithm_names, status_names)
+
+
+def cache_key(filename, cache_dir):
+    """
+    content hash of filename, memorized by (size, mtime) in cache_dir/index.json
+    so that an unchanged file is hashed only once
+    """
+    stat = os.stat(filename)
+    stamp = '{}:{}:{}'.format(os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+    index_file = os.path.join(cache_dir, 'index.json')
+    index = {}
+    if os.path.isfile(index_file):
+        try:
+            with open(index_file, 'r') as in_file:
+                index = json.load(in_file)
+        except ValueError:
+            index = {}
+    if stamp not in index:
+        index[stamp] = file_hash(filename)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = index_file + '.{}.tmp'.format(os.getpid())
+        with open(tmp_file, 'w') as out_file:
+            json.dump(index, out_file)
+        os.replace(tmp_file, index_file)
+    return index[stamp]
+
+
+def build_cache(filename, cache_dir, build):
+    """
+    path of the cache of filename in cache_dir/<sha1 of filename>/, calling build(path)
+    to create it if it does not exist yet
+    """
+    path = os.path.join(cache_dir, cache_key(filename, cache_dir))
+    if not os.path.isfile(os.path.join(path, 'meta.json')):
+        # write to a temporary directory first, concurrent trials may build the same cache
+        tmp_path = tempfile.mkdtemp(dir=cache_dir)
+        build(tmp_path)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # another process has finished the cache first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+
+def load_runs(filename, cache_dir = None):
+    """
+    load the algorithm runs file as a memory-mapped RunTable
+    the parsed columns are cached in cache_dir/<sha1 of filename>/ and reused by later processes
+    """
+    cache_dir = os.path.splitext(filename)[0] + '_cache' if cache_dir is None else cache_dir
+    path = build_cache(filename, cache_dir, lambda tmp_path: parse_runs(filename).save(tmp_path))
+    return RunTable.load(path)
@@ -1,8 +1,9 @@
 from argparse import ArgumentParser, FileType, ArgumentDefaultsHelpFormatter
 import os
-
+import sys
 import pickle
 import random
+import time
 import numpy as np
 import math
 from InstanceLoader import *
@@ -11,150 +12,96 @@ from torch.utils.data import DataLoader
 import torch.optim as optim
 from cnn import SimpleCNN, softCrossEntropy, WeightedMultiLabelBinaryClassification, WeightedMeanSquareError, WeightedNLLLoss
 from cnn import select_model, select_criterion
+from metrics import SelectionMetrics
+from store import load_performance, aggregate_performance, to_label_dict, CoordinateStore
 
 
-def process_one_instance(data):
-    instance_id = data[0][0]
-    dataset = instance_id.split('_')[0].strip()
+def load_labels(filename = '/home/kfzhao/data/ECJ_instances/algorithm_runs.arff.txt'):
     """
-    if dataset == 'rue':
-        return None, None, None
+    instance -> (best algorithm, {algorithm: median runtime, 36000 on timeout})
+    filename: arff run file or directory of a store.PerformanceTensor
     """
-    best_runtime = 36000
-    best_algorithm = 'all'
-    algorithm_to_result = {}
-    for i in range(50):
-        ins_id, repeat, algorithm, runtime, runstatus = \
-        data[i][0], data[i][1], data[i][2], data[i][3], data[4]
-        if ins_id != instance_id:
-            return None, None, None
-        if algorithm not in algorithm_to_result.keys():
-            algorithm_to_result[algorithm] = list([runtime])
-        else:
-            algorithm_to_result[algorithm].append(runtime)
-
-    algorithm_to_median = {} # algorithm-> median runtime
-    for key, value in algorithm_to_result.items():
-        value.sort()
-        algorithm_to_median[key] = (value[4] + value[5]) / 2.0
-        if value[5] < 3600:
-            if (value[4] + value[5]) / 2.0 < best_runtime:
-                best_runtime = (value[4] + value[5]) / 2.0 # median of the test performance
-                best_algorithm = key
-        else:
-            algorithm_to_median[key] = 36000.0
-    return instance_id, best_algorithm, algorithm_to_median
-
-def load_labels(filename = '/home/kfzhao/data/ECJ_instances/algorithm_runs.arff.txt'):
-
-    file = open(filename, 'r')
-    data = []
-    labels = {}
-    for line in file:
-        if line.strip().startswith('@') or line.strip() == '':
-            continue
-        line = line.strip().split(',')
-        ins_id, repeat, algorithm, runtime, runstatus = \
-        str(line[0]), int(line[1]), str(line[2]), float(line[3]), str(line[4])
-        data.append((ins_id, repeat, algorithm, runtime, runstatus))
-    file.close()
-    for i in range(int(len(data) / 50)):
-        instance_id, best_algorithm, algorithm_to_median = process_one_instance(data[i * 50: i * 50 + 50])
-        #print(instance_id, best_algorithm)
-        if instance_id is not None:
-            labels[instance_id] = (best_algorithm, algorithm_to_median)
-    #print("num of record:", len(data))
+    perf = load_performance(filename)
+    result = aggregate_performance(perf, t_max = 3600.0, penalize_factor = 10, ok_status = None)
+    labels = to_label_dict(result)
+    #print("num of record:", perf.runtime.size)
     #print("num of labels:", len(labels))
     return labels
 
+
+def label_file(instances_path):
+    """
+    the performance tensor under instances_path, or the arff run file to convert
+    """
+    label_path = os.path.join(instances_path, 'performance')
+    if not os.path.isdir(label_path):
+        label_path = os.path.join(instances_path, 'algorithm_runs.arff.txt')
+    return label_path
+
 def validate(args, model, dataloader):
     model.eval()
     device = args.device
-    num_instances = 0
-    correct = 0
-    for i, data in enumerate(dataloader):
-        if args.cuda:
-            data.to(device)
-
-        outputs = model(data)
-        outputs = outputs.squeeze()
-        #print(outputs)
-        idx = torch.argmax(outputs)
-        #print(idx)
-        if torch.equal(idx, data.y.squeeze()):
-            correct  = correct + 1
-        num_instances = num_instances + 1
-    accuracy = float(correct) / num_instances
-    return accuracy
-
-def compute_pred_performance(idx, run_time):
-    idx, run_time = idx.cpu().numpy(), run_time.numpy()
-    res = 0.0
-    best_runtime = 0.0
-    improve_cnt = 0
-    for i in range(idx.shape[0]): # for one batch
-        #print(run_time[i][idx[i]], run_time[i][1])
-        res += run_time[i][idx[i]]
-        best_runtime += np.min(run_time[i])
-        if run_time[i][idx[i]] <= run_time[i][1]:
-            improve_cnt += 1
-    return res, improve_cnt, best_runtime
-
-
-def cnn_validate(args, model, dataloader):
-    loss_type = args.loss_type
+    metrics = SelectionMetrics()
+    with torch.no_grad():
+        for i, data in enumerate(dataloader):
+            if args.cuda:
+                data.to(device)
+
+            outputs = model(data)
+            metrics.update(outputs, data.y, data.run_time)
+    result = metrics.compute()
+
+    if args.verbose:
+        print_metrics(result)
+
+    return result['accuracy']
+
+
+def prepare_inputs(args, data, batch_transform = None):
+    """
+    move a batch of images to the device, or build the images on the device with batch_transform
+    from a (padded coordinates, lengths) or a sparse_collate (index, value, counts) batch
+    """
+    if batch_transform is None:
+        return data.cuda() if args.cuda else data
+    if args.cuda:
+        data = [tensor.cuda() for tensor in data]
+    return batch_transform(*data)
+
+
+def cnn_validate(args, model, dataloader, batch_transform = None):
     model.eval()
-    num_instances = 0
-    correct = 0
-    improve = 0
-    pred_performance= 0.0
-    best_performance = 0.0
-    single_best_performance = 0.0
-    for i, (data, label, _, run_time) in enumerate(dataloader):
-        if args.cuda:
-            data, label = data.cuda(), label.cuda()
-
-        outputs = model(data)
-        if loss_type == 'sce' or loss_type == 'nll':
-            outputs = torch.nn.functional.log_softmax(outputs, dim=1)
-        elif loss_type == 'bce':
-            outputs = torch.nn.functional.sigmoid(outputs)
-        outputs = outputs.squeeze()
-
-        if loss_type == 'mse':
-            idx = torch.argmin(outputs, dim = 1)  # for mse loss
-        else :
-            idx = torch.argmax(outputs, dim = 1)
-        if loss_type == 'sce' or loss_type == 'bce':
-            label = torch.argmax(label, dim = 1)
-        elif loss_type == 'mse':
-            label = torch.argmin(label, dim=1)
-
-        #label = torch.argmax(label, dim = 1) # for soft cross entory, bce and mse
-        #idx = torch.argmin(outputs, dim = 1) # for mse loss
-        #label = torch.argmin(label, dim = 1)
-        #idx = torch.argmax(outputs, dim=1) # for nll loss
-
-        correct += (idx == label.squeeze()).sum().item()
-        num_instances += label.shape[0]
-        # compute the real performance
-        res, improve_cnt, best_runtime = compute_pred_performance(idx, run_time)
-        #print(idx, label)
-        pred_performance += res
-        best_performance += best_runtime
-        improve += improve_cnt
-        single_best_performance += (run_time[:, 1].sum().item())  # 1->eax.restart
-
-    accuracy = float(correct) / num_instances
-    improve_rate = float(improve) / num_instances
+    metrics = SelectionMetrics(args.loss_type)
+    with torch.no_grad():
+        for i, (data, label, _, run_time) in enumerate(dataloader):
+            data = prepare_inputs(args, data, batch_transform)
+            outputs = model(data)
+            metrics.update(outputs, label, run_time)
+    result = metrics.compute()
 
     if args.verbose:
-        print("pred performance={}".format(pred_performance))
-        print("single best performance={}".format(single_best_performance))
-        print("best performance={}".format(best_performance))
-        print("improve rate={}".format(improve_rate))
+        print_metrics(result)
+
+    return result['accuracy'], result['pred_performance']
 
-    return accuracy, pred_performance
+
+def print_metrics(result, prefix = ''):
+    print("{}pred performance={}".format(prefix, result['pred_performance']))
+    print("{}single best performance={}".format(prefix, result['single_best_performance']))
+    print("{}best performance={}".format(prefix, result['best_performance']))
+    print("{}improve rate={}".format(prefix, result['improve_rate']))
+
+
+def graph_dataloader(args, dataset, sizes, shuffle = True):
+    """
+    PyG DataLoader collating the graphs of dataset into Batch objects of about args.max_nodes nodes
+    and args.max_edges edges, sizes: (# nodes, # edges) of every graph of dataset
+    """
+    from torch_geometric.loader import DataLoader as GeoDataLoader
+    num_nodes, num_edges = sizes
+    batch_sampler = GraphBatchSampler(num_nodes, num_edges, args.max_nodes, args.max_edges, shuffle=shuffle)
+    return GeoDataLoader(dataset, batch_sampler=batch_sampler, num_workers=args.num_workers,
+                         persistent_workers=args.num_workers > 0)
 
 
 def batch_train(args, model, train_dataloader, val_dataloader, optimizer, scheduler = None):
@@ -164,34 +111,39 @@ def batch_train(args, model, train_dataloader, val_dataloader, optimizer, schedu
 
     for epoch in range(args.epoches):
         model.train()
+        total_loss, num_graphs = 0.0, 0
+        train_metrics = SelectionMetrics()
+        start = time.perf_counter()
         for i, data in enumerate(train_dataloader):
             if args.cuda:
-                data.to(device)
+                data = data.to(device)
 
+            # one optimizer step per Batch of graphs, the loss is the mean over its graphs
+            optimizer.zero_grad()
             outputs = model(data)
-            print(outputs.shape)
-            print('label:', data.y.shape)
-            #print(data.x.shape, data.edge_index.shape)
-            loss = torch.nn.functional.nll_loss(outputs, data.y) / args.batch_size
+            loss = torch.nn.functional.nll_loss(outputs, data.y.view(-1))
             loss.backward()
+            optimizer.step()
 
-            if (i + 1) % args.batch_size == 0:
-                optimizer.step()
-                optimizer.zero_grad()
-
-            if args.verbose and (i + 1) % 100 * args.batch_size == 0:
-                print('epoch:{} loss: {:^10}'.format(epoch, loss.item()))
+            total_loss += loss.detach() * data.num_graphs
+            num_graphs += data.num_graphs
+            train_metrics.update(outputs, data.y)
+        elapsed = time.perf_counter() - start
 
-        train_accuracy = validate(args, model, train_dataloader)
+        train_accuracy = train_metrics.compute()['accuracy']
         val_accuracy = validate(args, model, val_dataloader)
         if args.verbose:
+            print('epoch:{} loss: {:^10} graphs/s: {:.1f}'.format(epoch, float(total_loss) / max(num_graphs, 1),
+                                                                  num_graphs / elapsed))
             print('epoch:{} train accuracy: {:^10}'.format(epoch, train_accuracy))
             print('epoch:{} val accuracy: {:^10}'.format(epoch, val_accuracy))
 
     print("finish training.")
     return model
 
-def cnn_train(args, model, train_dataloader, val_dataloader, optimizer, criterion, scheduler = None):
+def cnn_train(args, model, train_dataloader, val_dataloader, optimizer, criterion, scheduler = None,
+              batch_transforms = (None, None)):
+    train_batch_transform, val_batch_transform = batch_transforms
     device = args.device
     if args.cuda:
         model.to(device)
@@ -201,9 +153,12 @@ def cnn_train(args, model, train_dataloader, val_dataloader, optimizer, criterio
     for epoch in range(args.epoches):
         total_loss = 0.0
         model.train()
+        # metrics of the training forward passes, no extra pass over the training set
+        train_metrics = SelectionMetrics(args.loss_type)
         for i, (data, label, weights, run_time) in enumerate(train_dataloader):
+            data = prepare_inputs(args, data, train_batch_transform)
             if args.cuda:
-                data, label, weights = data.cuda(), label.cuda(), weights.cuda()
+                label, weights = label.cuda(), weights.cuda()
 
             optimizer.zero_grad()
             outputs = model(data)
@@ -212,31 +167,40 @@ def cnn_train(args, model, train_dataloader, val_dataloader, optimizer, criterio
             loss.backward()
             optimizer.step()
 
-            total_loss += loss.item()
+            total_loss += loss.detach()
+            train_metrics.update(outputs, label, run_time)
 
-        #train_accuracy, train_performance = cnn_validate(args, model, train_dataloader)
-        val_accuracy, val_performance = cnn_validate(args, model, val_dataloader)
-        #max_train_acc = max(train_accuracy, max_train_acc)
+        train_result = train_metrics.compute()
+        train_accuracy, train_performance = train_result['accuracy'], train_result['pred_performance']
+        val_accuracy, val_performance = cnn_validate(args, model, val_dataloader, val_batch_transform)
+        max_train_acc = max(train_accuracy, max_train_acc)
         max_val_acc = max(val_accuracy, max_val_acc)
-        #best_train_performance = min(train_performance, best_train_performance)
+        best_train_performance = min(train_performance, best_train_performance)
         best_val_performance = min(val_performance, best_val_performance)
 
         # decay the learning rate
         if (epoch + 1) % args.decay_patience == 0:
             scheduler.step()
         if args.verbose:
-            print('epoch:{} loss: {:^10}'.format(epoch, total_loss))
-            #print('epoch:{} train accuracy: {:^10}'.format(epoch, train_accuracy))
+            print('epoch:{} loss: {:^10}'.format(epoch, float(total_loss)))
+            print('epoch:{} train accuracy: {:^10}'.format(epoch, train_accuracy))
             print('epoch:{} val accuracy: {:^10}'.format(epoch, val_accuracy))
     if args.verbose:
         print("finish training.")
     return model, max_train_acc, max_val_acc, best_train_performance, best_val_performance
 
 
-'''
-def main(args):
+GRAPH_MODELS = ('mpnn', 'cgcnn')
+
+
+def main_graph(args):
+    """
+    train MPNN / CGCNN on the --graph graphs of the instances, the first
+    1 / num_fold of the shuffled instances are the validation set
+    """
+    # mpnn needs torch_scatter, only the graph models import it
+    from mpnn.model import MPNN, CGCNN
     instances_path = args.instances_path
-    batch_size = args.batch_size
     num_node_feats = args.in_ch
     hid_ch = args.hid_ch
     out_ch = args.out_ch
@@ -250,38 +214,53 @@ def main(args):
     args.cuda = not args.no_cuda and torch.cuda.is_available()
     args.device = torch.device('cuda' if args.cuda else 'cpu')
 
-    labels = load_labels()
+    labels = load_labels(label_file(instances_path))
     # split the dataset
     keys = list(labels.keys())
     random.shuffle(keys)
-    train_keys, val_keys = keys[:1500], keys[1500:]
-    train_labels = { k : labels[k] for k in train_keys}
-    val_labels = {k : labels[k] for k in val_keys}
+    num_val = len(keys) // args.num_fold
+    train_keys, val_keys = keys[num_val:], keys[:num_val]
+
+    train_dataset = GeoInstanceDataset(num_node_feats, instances_path, labels, train_keys, args.edge_prob, args.graph)
+    val_dataset = GeoInstanceDataset(num_node_feats, instances_path, labels, val_keys, args.edge_prob, args.graph)
+    if args.verbose:
+        print("# training graphs: {}".format(len(train_dataset)))
+        print("# validation graphs: {}".format(len(val_dataset)))
+
+    train_dataloader = graph_dataloader(args, train_dataset, train_dataset.graph_sizes(), shuffle = True)
+    val_dataloader = graph_dataloader(args, val_dataset, val_dataset.graph_sizes(), shuffle = False)
+
+    if args.model_type == 'mpnn':
+        model = MPNN(in_ch= num_node_feats, hid_ch = hid_ch,
+                     out_ch = out_ch, num_edge_feats = 1,
+                     num_edge_hid= num_edge_hid, num_hid = num_hid,
+                     num_classes= args.num_classes, dropout = dropout, batch_norm = batch_norm,
+                     max_bytes = args.edge_max_bytes)
+    else:
+        model = CGCNN(in_ch= num_node_feats, num_edge_feats = 1, num_hid = num_hid,
+                      num_classes= args.num_classes, dropout = dropout, batch_norm = batch_norm)
 
+    optimizer = optim.Adam(model.parameters(),
+                           lr=lr, weight_decay=weight_decay)
 
-    train_dataset = GeoInstanceDataset(num_node_feats, instances_path, train_labels)
-    val_dataset = GeoInstanceDataset(num_node_feats, instances_path, val_labels)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, patience=100, factor=0.8)
 
-    train_dataloader = GeoDataLoader(train_dataset, batch_size = 1, shuffle = True)
-    val_dataloader = GeoDataLoader(val_dataset, batch_size=1, shuffle=True)
+    return batch_train(args, model, train_dataloader, val_dataloader, optimizer, scheduler)
 
+
+def image_channels(args):
     """
-    model = MPNN(in_ch= num_node_feats, hid_ch = hid_ch,
-                 out_ch = out_ch, num_edge_feats = 1,
-                 num_edge_hid= num_edge_hid, num_hid = num_hid,
-                 num_classes= 5, dropout = dropout, batch_norm = batch_norm)
+    tsp.raster channels of --image_channels, None for the 3 channel layout of the density image
     """
+    channels = [channel.strip() for channel in args.image_channels.split(',')]
+    return None if channels == ['density'] else channels
 
-    model = CGCNN(in_ch= num_node_feats, num_edge_feats = 1, num_hid = num_hid,
-                  num_classes= 5, dropout = dropout, batch_norm = batch_norm)
-
-    optimizer = optim.Adam(model.parameters(),
-                           lr=lr, weight_decay=weight_decay)
-
-    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, patience=100, factor=0.8)
 
-    model = batch_train(args, model, train_dataloader, val_dataloader, optimizer, scheduler)
-'''
+def is_point_model(args):
+    """
+    whether the model runs on the coordinates instead of the images
+    """
+    return args.model_type == 'pointnet'
 
 
 def build_transform(args):
@@ -289,10 +268,41 @@ def build_transform(args):
     num_grid = args.num_grid
     scale_factor = args.scale_factor
     flip = args.flip
-    bt = BuildTransformation(num_rotate, num_grid, scale_factor, flip)
+    bt = BuildTransformation(num_rotate, num_grid, scale_factor, flip, image_channels(args), args.input_channels == 3)
+    sparse = args.image_transport == 'sparse'
+    if args.raster_cache > 0 or args.raster_spill:
+        # one cache for the train and validation images, the validation image is the
+        # train image without rotation and flip
+        return bt.get_cached_transforms(RasterCache(args.raster_cache, args.raster_spill), sparse)
+    if sparse:
+        return bt.get_sparse_transforms()
 
     return bt.get_train_transform(), bt.get_val_transform()
 
+
+def build_collate(args):
+    """
+    collate functions of the train/val DataLoaders and the batch transforms to apply after the
+    device transfer for --batch_augment collate/device, all None for per-sample transforms
+    """
+    if is_point_model(args):
+        return (pad_collate, pad_collate), (BatchPointTransformation(args.num_rotate, args.flip, train=True),
+                                            BatchPointTransformation(args.num_rotate, args.flip, train=False))
+    if args.batch_augment == 'none':
+        if args.image_transport == 'sparse':
+            densify = BuildTransformation(args.num_rotate, args.num_grid, args.scale_factor, args.flip,
+                                          image_channels(args), args.input_channels == 3).get_sparse_densify()
+            return (sparse_collate, sparse_collate), (densify, densify)
+        return (None, None), (None, None)
+    if image_channels(args) is not None:
+        print("--batch_augment {} only supports the density image".format(args.batch_augment))
+        sys.exit()
+    bt = BuildTransformation(args.num_rotate, args.num_grid, args.scale_factor, args.flip, expand=args.input_channels == 3)
+    train_batch_transform, val_batch_transform = bt.get_batch_transforms()
+    if args.batch_augment == 'collate':
+        return (BatchCollate(train_batch_transform), BatchCollate(val_batch_transform)), (None, None)
+    return (pad_collate, pad_collate), (train_batch_transform, val_batch_transform)
+
 def main_cnn(args, train_dataset, val_dataset):
     batch_size = args.batch_size
     weight_decay = args.weight_decay
@@ -304,8 +314,13 @@ def main_cnn(args, train_dataset, val_dataset):
     args.cuda = not args.no_cuda and torch.cuda.is_available()
     args.device = torch.device('cuda' if args.cuda else 'cpu')
 
-    train_dataloader = DataLoader(train_dataset, batch_size = batch_size, shuffle= True, num_workers = num_workers)
-    val_dataloader = DataLoader(val_dataset, batch_size = 32, shuffle= False, num_workers = num_workers)
+    (train_collate, val_collate), batch_transforms = build_collate(args)
+    # keep the workers, and the raster caches of their datasets, alive across epochs
+    persistent_workers = num_workers > 0
+    train_dataloader = DataLoader(train_dataset, batch_size = batch_size, shuffle= True, num_workers = num_workers,
+                                  collate_fn = train_collate, persistent_workers = persistent_workers)
+    val_dataloader = DataLoader(val_dataset, batch_size = 32, shuffle= False, num_workers = num_workers,
+                                collate_fn = val_collate, persistent_workers = persistent_workers)
 
     model, criterion = select_model(args), select_criterion(args)
 
@@ -315,7 +330,7 @@ def main_cnn(args, train_dataset, val_dataset):
     scheduler = optim.lr_scheduler.ExponentialLR(optimizer, gamma=decay_factor)
 
     _, max_train_acc, max_val_acc, best_train_performance, best_val_performance = \
-        cnn_train(args, model, train_dataloader, val_dataloader, optimizer, criterion, scheduler)
+        cnn_train(args, model, train_dataloader, val_dataloader, optimizer, criterion, scheduler, batch_transforms)
     if args.verbose:
         print("max_train_accuracy={}".format(max_train_acc))
     print("max_val_accuracy={}".format(max_val_acc))
@@ -324,28 +339,39 @@ def main_cnn(args, train_dataset, val_dataset):
     return best_val_performance
 
 def cross_validation(args, num_fold = 5):
+    channels = image_channels(args)
+    if (channels is None and args.input_channels not in (1, 3)) or \
+            (channels is not None and args.input_channels != len(channels)):
+        print("--input_channels {} does not match --image_channels {}".format(args.input_channels, args.image_channels))
+        sys.exit()
 
     instances_path = args.instances_path
-    label_path = os.path.join(instances_path, 'algorithm_runs.arff.txt')
-    labels = load_labels(label_path)
+    # prefer the performance tensor, fall back to converting the arff run file
+    labels = load_labels(label_file(instances_path))
+
+    # packed coordinates are memory-mapped once and shared by all folds and workers
+    coordinates = CoordinateStore(args.coordinates) if args.coordinates else None
+    # load every instance once, the folds are index views of the registry
+    registry = InstanceRegistry(instances_path, labels, coordinates)
 
     # split the dataset
-    keys = list(labels.keys())
-    random.shuffle(keys)
-    num_instances = int(len(keys))
+    order = list(range(len(registry)))
+    random.shuffle(order)
+    num_instances = len(order)
     num_fold_instances = num_instances / num_fold
     train_transforms, val_transforms = build_transform(args)
+    if args.batch_augment != 'none' or is_point_model(args):
+        # the datasets return coordinates, rasterized (or only normalized) per batch (see build_collate)
+        train_transforms, val_transforms = None, None
     val_performance = 0.0
     for i in range(num_fold):
         start = int(i * num_fold_instances)
         end = num_instances if i == num_fold - 1 else int(i * num_fold_instances + num_fold_instances)
 
-        val_keys = keys[start: end]
-        train_keys = keys[: start] + keys[end:]
-        train_labels = {k: labels[k] for k in train_keys}
-        val_labels = {k: labels[k] for k in val_keys}
-        train_dataset = ArgumentDataset(args, instances_path, train_labels, train_transforms)
-        val_dataset = ArgumentDataset(args, instances_path, val_labels, val_transforms)
+        val_indices = order[start: end]
+        train_indices = order[: start] + order[end:]
+        train_dataset = ArgumentDataset(args, registry, train_indices, train_transforms)
+        val_dataset = ArgumentDataset(args, registry, val_indices, val_transforms)
         if args.verbose:
             print("Fold {}: # training images: {}".format(i,train_dataset.num))
             print("Fold {}: # validation images: {}".format(i,val_dataset.num))
@@ -354,11 +380,34 @@ def cross_validation(args, num_fold = 5):
             print("Fold {} finished.".format(i))
     avg_run_time = 0 - val_performance / num_instances
     print("avg_run_time={}".format(avg_run_time))
+    return avg_run_time, num_instances
+
+
+def benchmark_models(args, model_types):
+    """
+    cross validation of every model type on the same folds, reports the PAR10 (avg_run_time) and the
+    throughput (train and validation samples per second, data loading included)
+    """
+    seed = 0 if args.seed is None else args.seed
+    results = []
+    for model_type in model_types:
+        args.model_type = model_type
+        random.seed(seed)
+        np.random.seed(seed)
+        torch.manual_seed(seed)
+        start = time.time()
+        avg_run_time, num_instances = cross_validation(args, args.num_fold)
+        elapsed = time.time() - start
+        # every instance is trained on in num_fold - 1 folds and validated in one, every epoch
+        results.append((model_type, avg_run_time, num_instances * args.num_fold * args.epoches / elapsed))
+    print("{:>12} {:>14} {:>14}".format('model_type', 'avg_run_time', 'samples/s'))
+    for model_type, avg_run_time, throughput in results:
+        print("{:>12} {:>14.3f} {:>14.1f}".format(model_type, avg_run_time, throughput))
+    return results
 
 if __name__ == "__main__":
     parser = ArgumentParser("TSP Selector", formatter_class=ArgumentDefaultsHelpFormatter, conflict_handler="resolve")
-    """
-    # Model Settings (ONLY FOR MPNN MODEL)
+    # Model Settings (ONLY FOR GRAPH MODELS, --model_type mpnn or cgcnn)
     parser.add_argument("--in_ch", default=2, type=int,
                         help="input features dim of nodes")
     parser.add_argument("--hid_ch", default=32, type=int,
@@ -369,10 +418,18 @@ if __name__ == "__main__":
                         help="number of hidden units of edge network")
     parser.add_argument("--num_hid", default=32, type=int,
                         help="number of hidden units of MLP")
-    parser.add_argument('--dropout', type=float, default=0.5,
-                        help='Dropout rate (1 - keep probability).')
     parser.add_argument("--batch_norm", default=False, type=bool)
-    """
+    parser.add_argument("--max_nodes", default=20000, type=int,
+                        help="node budget of a batch of graphs")
+    parser.add_argument("--max_edges", default=None, type=int,
+                        help="edge budget of a batch of graphs, no limit if not given")
+    parser.add_argument("--edge_max_bytes", default=1 << 28, type=int,
+                        help="memory budget of the per-edge weights of an MPNN layer, the edges are streamed in chunks")
+    parser.add_argument("--graph", type=str, default='complete', choices=['complete', 'knn', 'delaunay'],
+                        help="graph of an instance: the complete graph of util.load_tsp_instance, or the sparse "
+                             "knn / delaunay graph of util.save_tsp_graph (<instance>_<graph>.pickle)")
+    parser.add_argument("--edge_prob", default=0.5, type=float,
+                        help="share of the edges of the complete graph sampled for every graph, by inverse distance")
     # Simple CNN Settings
     parser.add_argument("--num_cov_layer", default=5, type=int,
                         help="number of convolution layers")
@@ -398,8 +455,31 @@ if __name__ == "__main__":
     parser.add_argument("--scale_factor", default=4, type=int,
                         help="reduce the image resolution by scale_factor")
     parser.add_argument("--flip", default=True, type=bool)
+    parser.add_argument("--batch_augment", type=str, default='none', choices=['none', 'collate', 'device'],
+                        help="augment and rasterize per sample (none), per batch in the DataLoader workers "
+                             "(collate) or per batch after the transfer to the device (device)")
+    parser.add_argument("--image_channels", type=str, default='density',
+                        help="comma separated image channels of tsp/raster.py (density, nn_distance, hull_distance), "
+                             "density alone keeps the 3 channel density image")
+    parser.add_argument("--raster_cache", default=0, type=int,
+                        help="number of rasterized images kept in memory by each DataLoader worker, 0 disables")
+    parser.add_argument("--raster_spill", type=str, default=None,
+                        help="directory of the on-disk rasterized images shared by the workers of a run")
+    parser.add_argument("--image_transport", type=str, default='dense', choices=['dense', 'sparse'],
+                        help="ship the images from the DataLoader workers as dense tensors, or as the non-zero "
+                             "cells of the native grid image densified per batch on the device")
     # Model Settings (ONLY FOR CNN)
-    parser.add_argument("--model_type", type=str, default='resnet18')
+    parser.add_argument("--model_type", type=str, default='resnet18',
+                        help="a model of cnn.select_model (resnet18, vgg11, pointnet, ...), or mpnn / cgcnn for the graph models")
+    parser.add_argument("--point_hids", type=str, default='64 128 256',
+                        help="hidden units of the shared point MLP of pointnet")
+    parser.add_argument("--point_mlp_hids", type=str, default='256 128',
+                        help="hidden units of the classifier of pointnet")
+    parser.add_argument("--input_channels", default=3, type=int,
+                        help="input channels of the model stem, 3 for the 3 channel layout of the density image, "
+                             "1 for the density image as it is, the number of --image_channels otherwise")
+    parser.add_argument("--checkpoint", type=str, default=None,
+                        help="state dict to initialize the model, 3 channel stems are folded into 1 channel stems")
     parser.add_argument("--loss_type", type=str, default='nll')
     # Training settings
     parser.add_argument("--num_classes", default=5, type=int,
@@ -416,16 +496,30 @@ if __name__ == "__main__":
     parser.add_argument('--decay_patience', type=int, default=50,
                         help='num of epoches for one lr decay.')
     parser.add_argument('--weight_exp', type=float, default=2.0,
-                        help='loss weight exp factor.')
+                        help='loss weight exp factor, nll weights an instance by runtime^exp of the predicted algorithm.')
     parser.add_argument('--no-cuda', action='store_true', default=False,
                         help='Disables CUDA training.')
     parser.add_argument('--num_workers', type = int, default= 16,
                         help='number of workers for Dataset.')
     # Other
     parser.add_argument("--instances_path", type=str, default="/home/kfzhao/data/ECJ_instances_coo")
+    parser.add_argument("--coordinates", type=str, default=None,
+                        help="packed coordinate file (.pack, or .zip storing one), see store/coords.py")
+    parser.add_argument("--seed", default=None, type=int,
+                        help="random seed of the fold split")
+    parser.add_argument("--benchmark", type=str, default=None,
+                        help="comma separated model types (e.g. resnet18,pointnet) to compare on the same folds")
     parser.add_argument("--verbose", default=True, type=bool)
     args = parser.parse_args()
     if args.verbose:
         print(args)
 
-    cross_validation(args, args.num_fold)
+    if args.benchmark:
+        benchmark_models(args, [model_type.strip() for model_type in args.benchmark.split(',')])
+    else:
+        if args.seed is not None:
+            random.seed(args.seed)
+        if args.model_type in GRAPH_MODELS:
+            main_graph(args)
+        else:
+            cross_validation(args, args.num_fold)
@@ -0,0 +1,6 @@
+from .raster import rasterize, density_image, grid_index, CHANNELS
+from .graph import build_graph, knn_graph, delaunay_graph
+from .distance import distance_matrix, complete_graph, distance_blocks
+from .reorder import spatial_order, hilbert_index, morton_index, pca_projection, permute_matrix
+from .tsplib import read_coordinates, read_tsp, read_directory
+from .sampling import EdgeSampler, edge_sampler, weighted_sample
@@ -0,0 +1,69 @@
+import numpy as np
+from scipy.spatial.distance import cdist
+
+
+"""
+pairwise euclidean distances of (N, 2) coordinates, computed in row blocks so that the
+temporary memory stays under max_bytes whatever N is, the results are written into
+caller-provided (e.g. np.memmap) arrays
+"""
+
+
+def block_rows(num_nodes, max_bytes = 1 << 28):
+    """
+    number of rows of a block, a block holds (rows, N) float64 distances
+    """
+    return int(max(1, min(num_nodes, max_bytes // (8 * max(num_nodes, 1)))))
+
+
+def distance_blocks(x, max_bytes = 1 << 28):
+    """
+    yield (start, end, block), block: (end - start, N) float64 distances of the cities start: end to all cities
+    """
+    x = np.asarray(x, dtype=np.float64)
+    num_nodes = x.shape[0]
+    step = block_rows(num_nodes, max_bytes)
+    for start in range(0, num_nodes, step):
+        end = min(start + step, num_nodes)
+        yield start, end, cdist(x[start: end], x)
+
+
+def distance_matrix(x, out = None, max_bytes = 1 << 28):
+    """
+    (N, N) float32 distance matrix, written into out if given
+    """
+    num_nodes = x.shape[0]
+    out = np.zeros((num_nodes, num_nodes), dtype=np.float32) if out is None else out
+    for start, end, block in distance_blocks(x, max_bytes):
+        out[start: end] = block
+    return out
+
+
+def num_complete_edges(x):
+    """
+    number of non-zero off-diagonal entries of the distance matrix, N (N - 1) minus the pairs of duplicated cities
+    """
+    _, counts = np.unique(np.asarray(x), axis=0, return_counts=True)
+    return int(x.shape[0] * (x.shape[0] - 1) - (counts * (counts - 1)).sum())
+
+
+def complete_graph(x, edge_index = None, edge_attr = None, max_bytes = 1 << 28):
+    """
+    complete graph in the order of scipy.sparse.csr_matrix(distance matrix): row-major non-zero entries,
+    so the diagonal and the edges between duplicated cities are left out
+    :param edge_index: (2, num_complete_edges(x)) int32 output, allocated if None
+    :param edge_attr: (num_complete_edges(x), ) float32 output, allocated if None
+    """
+    num_edges = num_complete_edges(x)
+    edge_index = np.zeros((2, num_edges), dtype=np.int32) if edge_index is None else edge_index
+    edge_attr = np.zeros((num_edges), dtype=np.float32) if edge_attr is None else edge_attr
+    offset = 0
+    for start, end, block in distance_blocks(x, max_bytes):
+        block = block.astype(np.float32)
+        row, col = np.nonzero(block)
+        edge_index[0, offset: offset + row.shape[0]] = row + start
+        edge_index[1, offset: offset + row.shape[0]] = col
+        edge_attr[offset: offset + row.shape[0]] = block[row, col]
+        offset += row.shape[0]
+    assert offset == num_edges
+    return edge_index, edge_attr
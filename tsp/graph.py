@@ -0,0 +1,85 @@
+import numpy as np
+from scipy.spatial import Delaunay, cKDTree
+try:
+    from scipy.spatial import QhullError
+except ImportError:
+    from scipy.spatial.qhull import QhullError
+
+
+"""
+sparse graphs of (N, 2) coordinates for the MPNN / CGCNN models
+edge_index: int32 (2, E), both directions of every undirected edge, sorted by source then target
+edge_attr: float32 (E, ), euclidean length of the edge
+"""
+
+
+def symmetric_edges(row, col, num_nodes):
+    """
+    both directions of the edges (row, col), without duplicates and self loops
+    """
+    row, col = np.concatenate([row, col]), np.concatenate([col, row])
+    key = row.astype(np.int64) * num_nodes + col
+    key = np.sort(key[row != col])
+    if key.shape[0] > 0:
+        key = key[np.r_[True, key[1:] != key[:-1]]]
+    return key // num_nodes, key % num_nodes
+
+
+def edge_length(x, row, col):
+    diff = x[row] - x[col]
+    return np.sqrt((diff * diff).sum(axis=1))
+
+
+def to_compact(x, row, col):
+    edge_index = np.stack([row, col]).astype(np.int32)
+    edge_attr = edge_length(np.asarray(x, dtype=np.float64), row, col).astype(np.float32)
+    return edge_index, edge_attr
+
+
+def knn_graph(x, k = 8):
+    """
+    every city connected to its k nearest cities (and to the cities having it as a k nearest city)
+    """
+    num_nodes = x.shape[0]
+    k = min(k, num_nodes - 1)
+    if k <= 0:
+        return np.zeros((2, 0), dtype=np.int32), np.zeros((0), dtype=np.float32)
+    _, index = cKDTree(x, balanced_tree=False, compact_nodes=False).query(x, k=k + 1)
+    # the nearest city of a city is itself, except for duplicated cities, self loops are dropped anyway
+    row = np.repeat(np.arange(num_nodes), k + 1)
+    row, col = symmetric_edges(row, index.reshape(-1), num_nodes)
+    return to_compact(x, row, col)
+
+
+def delaunay_graph(x):
+    """
+    edges of the Delaunay triangulation, a planar graph with < 3N edges that contains
+    the euclidean minimum spanning tree and the nearest neighbour graph
+    """
+    num_nodes = x.shape[0]
+    try:
+        triangulation = Delaunay(x)
+    except (QhullError, ValueError):
+        # fewer than 3 cities or all on one line
+        return knn_graph(x, k=2)
+    simplices = triangulation.simplices
+    row = np.concatenate([simplices[:, 0], simplices[:, 1], simplices[:, 2]])
+    col = np.concatenate([simplices[:, 1], simplices[:, 2], simplices[:, 0]])
+    # duplicated cities are left out of the triangulation, connect them to the vertex at the same place
+    coplanar = triangulation.coplanar
+    row, col = np.concatenate([row, coplanar[:, 0]]), np.concatenate([col, coplanar[:, 2]])
+    row, col = symmetric_edges(row, col, num_nodes)
+    return to_compact(x, row, col)
+
+
+def build_graph(x, method = 'knn', k = 8):
+    """
+    :param method: 'knn' or 'delaunay'
+    :return: edge_index (2, E) int32, edge_attr (E, ) float32
+    """
+    x = np.asarray(x)
+    if method == 'knn':
+        return knn_graph(x, k)
+    if method == 'delaunay':
+        return delaunay_graph(x)
+    raise ValueError("unknown graph {}, expect knn or delaunay".format(method))
@@ -0,0 +1,133 @@
+import sys
+import time
+import numpy as np
+from scipy.spatial import ConvexHull, cKDTree
+try:
+    from scipy.spatial import QhullError
+except ImportError:
+    from scipy.spatial.qhull import QhullError
+
+
+"""
+rasterization of normalized (N, 2) coordinates into (num_grid, num_grid) images
+every city is put into one cell and every channel is one bincount over the cell indices,
+so the cost is O(N) vectorized work plus the per-city features of the channel
+"""
+
+
+def grid_index(x, num_grid = 64):
+    """
+    flat cell index (N, ) of every city, the same cell as the legacy ToImage loop:
+    int(x * num_grid) - 1, where -1 wraps to the last cell like the numpy index
+    """
+    idx = np.remainder(np.trunc(np.asarray(x) * num_grid).astype(np.int64) - 1, num_grid)
+    return idx[:, 0] * num_grid + idx[:, 1]
+
+
+def nearest_neighbor_distance(x):
+    """
+    (N, ) distance of every city to its nearest other city
+    """
+    if x.shape[0] < 2:
+        return np.zeros(shape=(x.shape[0]), dtype=np.float64)
+    # the unbalanced tree builds faster and queries as fast on city-like point sets
+    distance, _ = cKDTree(x, balanced_tree=False, compact_nodes=False).query(x, k=2)
+    return distance[:, 1]
+
+
+def hull_distance(x, chunk_size = 1 << 20):
+    """
+    (N, ) distance of every city to the boundary of the convex hull of all cities
+    the hull is the intersection of the half planes n . x + b <= 0 (unit normals n),
+    so the distance of an inner point is min(-(n . x + b)) over the facets
+    """
+    try:
+        equations = ConvexHull(x).equations
+    except (QhullError, ValueError):
+        # fewer than 3 cities or all on one line, every city is on the hull
+        return np.zeros(shape=(x.shape[0]), dtype=np.float64)
+    distance = np.empty(shape=(x.shape[0]), dtype=np.float64)
+    # (chunk, # facets) at a time
+    step = max(1, chunk_size // equations.shape[0])
+    for start in range(0, x.shape[0], step):
+        end = start + step
+        offset = x[start: end] @ equations[:, :2].T + equations[:, 2]
+        distance[start: end] = np.maximum(-offset.max(axis=1), 0.0)
+    return distance
+
+
+"""
+name -> per-city value averaged over the cities of each cell, 'density' is the city count
+"""
+CHANNELS = {'density': None,
+            'nn_distance': nearest_neighbor_distance,
+            'hull_distance': hull_distance}
+
+
+def density_image(x, num_grid = 64):
+    """
+    (num_grid, num_grid) number of cities in each cell
+    """
+    counts = np.bincount(grid_index(x, num_grid), minlength=num_grid * num_grid)
+    return counts.astype(np.float32).reshape(num_grid, num_grid)
+
+
+def rasterize(x, num_grid = 64, channels = ('density', )):
+    """
+    (# channels, num_grid, num_grid) image of the normalized coordinates x in one pass
+    :param channels: names in CHANNELS, the cell index and the counts are shared by all channels
+    """
+    x = np.asarray(x, dtype=np.float64)
+    size = num_grid * num_grid
+    idx = grid_index(x, num_grid)
+    counts = np.bincount(idx, minlength=size).astype(np.float64)
+    image = np.zeros(shape=(len(channels), size), dtype=np.float32)
+    for i, channel in enumerate(channels):
+        if channel not in CHANNELS:
+            raise ValueError("unknown channel {}, expect one of {}".format(channel, list(CHANNELS)))
+        if CHANNELS[channel] is None:
+            image[i] = counts
+        else:
+            total = np.bincount(idx, weights=CHANNELS[channel](x), minlength=size)
+            image[i] = total / np.maximum(counts, 1.0)
+    return image.reshape(len(channels), num_grid, num_grid)
+
+
+def loop_density_image(x, num_grid = 64):
+    """
+    the per-city loop of transform.ToImage, reference of the benchmark
+    """
+    image = np.zeros((num_grid, num_grid), dtype=np.float32)
+    for i in range(x.shape[0]):
+        idx_x = int(x[i][0] * num_grid) - 1
+        idx_y = int(x[i][1] * num_grid) - 1
+        image[idx_x][idx_y] = image[idx_x][idx_y] + 1.0
+    return image
+
+
+def benchmark(sizes = (500, 1000, 5000, 10000, 50000, 100000), num_grid = 64, repeat = 5):
+    """
+    per-instance time (ms) of the loop, the density channel, each feature channel and all channels together
+    """
+    columns = ['loop', 'density'] + [channel for channel in CHANNELS if channel != 'density'] + ['all']
+    print("{:>8} ".format('N') + " ".join("{:>14}".format(column) for column in columns))
+    rng = np.random.RandomState(0)
+    for n in sizes:
+        x = rng.rand(n, 2)
+        funcs = [lambda: loop_density_image(x, num_grid), lambda: density_image(x, num_grid)] + \
+                [lambda channel = channel: rasterize(x, num_grid, (channel, ))
+                 for channel in CHANNELS if channel != 'density'] + \
+                [lambda: rasterize(x, num_grid, tuple(CHANNELS))]
+        assert np.array_equal(loop_density_image(x, num_grid), density_image(x, num_grid))
+        times = []
+        for func in funcs:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                func()
+            times.append((time.perf_counter() - start) / repeat * 1000)
+        print("{:>8} ".format(n) + " ".join("{:>14.3f}".format(t) for t in times))
+
+
+if __name__ == "__main__":
+    # python -m tsp.raster [num_grid]
+    benchmark(num_grid=int(sys.argv[1]) if len(sys.argv) > 1 else 64)
@@ -0,0 +1,199 @@
+import sys
+import time
+import numpy as np
+
+
+"""
+spatial orders of the cities, used to permute distance matrices so that near cities get near rows
+all functions work on a batch of instances of the same size, (..., N, 2) coordinates -> (..., N) keys
+"""
+
+
+def quantize(x, p = 10):
+    """
+    normalized coordinates in [0, 1] -> integer grid coordinates in [0, 2^p)
+    """
+    return np.clip((np.asarray(x) * (1 << p)).astype(np.int64), 0, (1 << p) - 1)
+
+
+def hilbert_index(points, p = 10):
+    """
+    distance along the Hilbert curve of order p of integer points (..., n) in [0, 2^p),
+    Skilling's transpose algorithm as in hilbertcurve.HilbertCurve(p, n), on whole arrays
+    """
+    point = np.array(points, dtype=np.int64)
+    n = point.shape[-1]
+    m = 1 << (p - 1)
+
+    # inverse undo excess work
+    q = m
+    while q > 1:
+        mask = q - 1
+        for i in range(n):
+            bit = (point[..., i] & q) != 0
+            t = np.where(bit, 0, (point[..., 0] ^ point[..., i]) & mask)
+            point[..., i] ^= t
+            point[..., 0] ^= np.where(bit, mask, t)
+        q >>= 1
+
+    # gray encode
+    for i in range(1, n):
+        point[..., i] ^= point[..., i - 1]
+    t = np.zeros(point.shape[:-1], dtype=np.int64)
+    q = m
+    while q > 1:
+        t ^= np.where(point[..., n - 1] & q, q - 1, 0)
+        q >>= 1
+    point ^= t[..., None]
+
+    # transpose to the hilbert integer, interleave the bits, dimension 0 first
+    distance = np.zeros(point.shape[:-1], dtype=np.int64)
+    for b in range(p - 1, -1, -1):
+        for i in range(n):
+            distance = (distance << 1) | ((point[..., i] >> b) & 1)
+    return distance
+
+
+def _part1by1(v):
+    """
+    spread the lower 32 bits of v to the even bits
+    """
+    v = v.astype(np.uint64) & np.uint64(0x00000000FFFFFFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x3333333333333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return v
+
+
+def morton_index(points, p = 10):
+    """
+    Z-order index of integer points (..., 2) in [0, 2^p), the bits of dimension 0 first
+    """
+    points = np.asarray(points)
+    return ((_part1by1(points[..., 0]) << np.uint64(1)) | _part1by1(points[..., 1])).astype(np.int64)
+
+
+def pca_projection(x):
+    """
+    projection of the cities on the first principal component, the sign follows sklearn's PCA
+    (the largest absolute entry of the component is positive)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    centered = x - x.mean(axis=-2, keepdims=True)
+    covariance = np.einsum('...ni,...nj->...ij', centered, centered)
+    _, vectors = np.linalg.eigh(covariance)
+    component = vectors[..., :, -1]
+    sign = np.sign(np.take_along_axis(component, np.abs(component).argmax(axis=-1)[..., None], axis=-1))
+    return np.einsum('...ni,...i->...n', centered, component * np.where(sign == 0, 1, sign))
+
+
+def spatial_order(x, method = 'hilbert', p = 10):
+    """
+    (..., N) order of the cities along the Hilbert curve, the Z curve or the first principal component
+    :param x: (..., N, 2) normalized coordinates
+    """
+    if method == 'hilbert':
+        key = hilbert_index(quantize(x, p), p)
+    elif method == 'morton':
+        key = morton_index(quantize(x, p), p)
+    elif method == 'pca':
+        key = pca_projection(x)
+    else:
+        raise ValueError("unknown order {}, expect hilbert, morton or pca".format(method))
+    return np.argsort(key, axis=-1, kind='stable')
+
+
+def inverse_permutation(order):
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.broadcast_to(np.arange(order.shape[-1]), order.shape), axis=-1)
+    return ranks
+
+
+def permute_matrix(A, order):
+    """
+    A[order][:, order] with one fancy index, for (N, N) matrices or (..., N, N) batches with (..., N) orders
+    """
+    A, order = np.asarray(A), np.asarray(order)
+    if A.ndim == 2:
+        return A[np.ix_(order, order)]
+    # np.ix_ per instance gathers faster than one take_along_axis over the batch
+    permuted = np.empty_like(A)
+    for index in np.ndindex(A.shape[:-2]):
+        permuted[index] = A[index][np.ix_(order[index], order[index])]
+    return permuted
+
+
+def loop_hilbert_index(x):
+    """
+    the per-point curve loop of util.hilbert_matrix_reorder, reference of the benchmark
+    """
+    from hilbertcurve.hilbertcurve import HilbertCurve
+    N = x.shape[0]
+    x_norm = x * 1000
+    x_norm = x_norm.astype(int)
+    hilbert_curve = HilbertCurve(10, 2)
+    # hilbertcurve 2.x renamed distance_from_coordinates
+    distance = getattr(hilbert_curve, 'distance_from_coordinates', None) or hilbert_curve.distance_from_point
+    temp = np.zeros(shape=(N))
+    for i in range(N):
+        temp[i] = distance([x_norm[i][0], x_norm[i][1]])
+    return temp
+
+
+def loop_permute_matrix(A, ranks):
+    """
+    the per-column and per-row permutation loops of util.matrix_reorder, reference of the benchmark
+    """
+    N = A.shape[0]
+    for i in range(N):
+        A[:, i] = A[ranks, i]
+    for i in range(N):
+        A[i, :] = A[i, ranks]
+    return A
+
+
+def benchmark(sizes = (500, 1000, 2000, 5000), batch_size = 16, repeat = 3):
+    """
+    time (ms) per instance of the hilbert keys and the matrix permutation, loop code vs vectorized,
+    and of the whole reorder of a batch of instances
+    """
+    from scipy.spatial.distance import cdist
+    columns = ['loop keys', 'keys', 'loop permute', 'permute', 'batched']
+    print("{:>8} ".format('N') + " ".join("{:>14}".format(column) for column in columns))
+    rng = np.random.RandomState(0)
+    for n in sizes:
+        x = rng.rand(batch_size, n, 2)
+        A = np.stack([cdist(x[b], x[b]) for b in range(batch_size)]).astype(np.float32)
+        times = []
+
+        start = time.perf_counter()
+        expected_keys = loop_hilbert_index(x[0])
+        times.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            keys = hilbert_index((x[0] * 1000).astype(int))
+        times.append((time.perf_counter() - start) / repeat * 1000)
+        assert np.array_equal(keys, expected_keys)
+
+        ranks = inverse_permutation(np.argsort(keys, kind='stable'))
+        start = time.perf_counter()
+        expected = loop_permute_matrix(A[0].copy(), ranks)
+        times.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = permute_matrix(A[0], ranks)
+        times.append((time.perf_counter() - start) / repeat * 1000)
+        assert np.array_equal(result, expected)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            permute_matrix(A, spatial_order(x))
+        times.append((time.perf_counter() - start) / repeat / batch_size * 1000)
+        print("{:>8} ".format(n) + " ".join("{:>14.3f}".format(t) for t in times))
+
+
+if __name__ == "__main__":
+    # python -m tsp.reorder [batch_size]
+    benchmark(batch_size=int(sys.argv[1]) if len(sys.argv) > 1 else 16)
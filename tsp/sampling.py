@@ -0,0 +1,136 @@
+import sys
+import time
+import numpy as np
+
+
+"""
+weighted sampling of edges without replacement in one vectorized pass
+drawing k items without replacement with probabilities proportional to w (the successive draws of
+np.random.choice(replace=False, p=w / w.sum())) is the same as taking the k largest log(w) + Gumbel noise,
+or the k smallest scale * E with E ~ Exp(1) and scale = 1 / w (exponential race), so the per-edge
+key is the scale, precomputed once per instance: the edge length itself for the inverse-distance weights
+"""
+
+
+def race(scale, rng = None):
+    """
+    scale * E, E ~ Exp(1), the k smallest are a weighted sample without replacement of size k
+    """
+    rng = np.random if rng is None else rng
+    # 1 - U in (0, 1], so the exponential variable is finite
+    return scale * -np.log1p(-rng.random(np.shape(scale)))
+
+
+def smallest(keys, k):
+    """
+    indices of the k smallest keys (..., n) along the last axis, in no particular order
+    """
+    n = keys.shape[-1]
+    if k >= n:
+        return np.broadcast_to(np.arange(n), keys.shape).copy()
+    return np.argpartition(keys, k - 1, axis=-1)[..., :k]
+
+
+def sample_size(num_edges, prob):
+    return int(num_edges * prob)
+
+
+def weighted_sample(scale, k, rng = None):
+    """
+    k indices drawn without replacement with probabilities proportional to 1 / scale
+    """
+    return smallest(race(np.asarray(scale), rng), k)
+
+
+def edge_sampler(edge_index, edge_attr, prob = 0.5, rng = None):
+    """
+    a prob share of the edges drawn without replacement with probabilities proportional to 1 / edge_attr
+    """
+    idx = weighted_sample(edge_attr, sample_size(edge_attr.shape[0], prob), rng)
+    return edge_index[:, idx], edge_attr[idx]
+
+
+class EdgeSampler(object):
+    """
+    race scales of the edges of many instances, kept as they are (e.g. the memory-mapped edge_attr.npy of
+    util.load_tsp_instance for the inverse-distance weights), and batched draws over several instances
+    """
+    def __init__(self, scales):
+        """
+        scales: list of (E_i, ) arrays, 1 / weight of every edge of instance i
+        """
+        self.scales = list(scales)
+        self.sizes = np.array([scale.shape[0] for scale in self.scales], dtype=np.int64)
+
+    @staticmethod
+    def from_weights(weights):
+        return EdgeSampler([1.0 / np.asarray(weight, dtype=np.float32) for weight in weights])
+
+    def __len__(self):
+        return len(self.scales)
+
+    def sample(self, i, prob = 0.5, rng = None):
+        """
+        edge indices of a weighted sample of instance i
+        """
+        return weighted_sample(self.scales[i], sample_size(self.sizes[i], prob), rng)
+
+    def sample_batch(self, indices, prob = 0.5, rng = None):
+        """
+        edge indices of a weighted sample of each instance of indices, the exponential variables
+        of all instances are drawn in one pass, instances of one size are partitioned in one call
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        sizes = self.sizes[indices]
+        if indices.shape[0] > 0 and np.all(sizes == sizes[0]):
+            keys = race(np.stack([self.scales[i] for i in indices]), rng)
+            return list(smallest(keys, sample_size(sizes[0], prob)))
+        offsets = np.zeros(indices.shape[0] + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        keys = race(np.concatenate([self.scales[i] for i in indices]), rng)
+        return [smallest(keys[offsets[j]: offsets[j + 1]], sample_size(sizes[j], prob))
+                for j in range(indices.shape[0])]
+
+
+def loop_edge_sampler(edge_index, edge_attr, prob = 0.5):
+    """
+    the np.random.choice sampler of InstanceLoader.edge_sampler, reference of the benchmark
+    """
+    edge_num = edge_attr.shape[0]
+    p = 1.0 / edge_attr
+    p = p / np.sum(p)
+    sample_size = int(edge_num * prob)
+    idx = np.random.choice(edge_num, size= sample_size, replace = False, p = p)
+    return edge_index[:, idx], edge_attr[idx]
+
+
+def benchmark(sizes = (100, 300, 1000), batch_size = 16, repeat = 3):
+    """
+    time (ms) per instance of sampling half of the edges of the complete graph of N random cities,
+    np.random.choice vs one exponential race per instance vs batched races over batch_size instances
+    """
+    from tsp.distance import complete_graph
+    columns = ['E', 'choice', 'race', 'batched']
+    print("{:>8} ".format('N') + " ".join("{:>12}".format(column) for column in columns))
+    rng = np.random.RandomState(0)
+    for n in sizes:
+        graphs = [complete_graph(rng.rand(n, 2)) for _ in range(batch_size)]
+        edge_index, edge_attr = graphs[0]
+        sampler = EdgeSampler([graph[1] for graph in graphs])
+        times = []
+        for func in [lambda: loop_edge_sampler(edge_index, edge_attr),
+                     lambda: edge_sampler(edge_index, edge_attr)]:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                func()
+            times.append((time.perf_counter() - start) / repeat * 1000)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            sampler.sample_batch(np.arange(batch_size))
+        times.append((time.perf_counter() - start) / repeat / batch_size * 1000)
+        print("{:>8} {:>12} ".format(n, edge_attr.shape[0]) + " ".join("{:>12.3f}".format(t) for t in times))
+
+
+if __name__ == "__main__":
+    # python -m tsp.sampling [batch_size]
+    benchmark(batch_size=int(sys.argv[1]) if len(sys.argv) > 1 else 16)
@@ -1,16 +1,20 @@
 import os
 import pickle
-import tsplib95
+import shutil
+import tempfile
 import numpy as np
 from math import pi, sin, cos
-import scipy.sparse as sp
-from sklearn.decomposition import PCA
 from scipy import sparse
-from hilbertcurve.hilbertcurve import HilbertCurve
 import matplotlib.pyplot as plt
 
-from torch_geometric.utils.convert import from_scipy_sparse_matrix
-from scipy.spatial.distance import euclidean
+from store import load_performance, aggregate_performance, to_label_dict
+from store.reader import dump, load
+from tsp.raster import density_image
+from tsp.tsplib import read_coordinates
+from tsp.graph import build_graph
+from tsp.distance import distance_matrix, complete_graph, num_complete_edges
+from tsp.reorder import spatial_order, hilbert_index, inverse_permutation, permute_matrix
+from numpy.lib.format import open_memmap
 pathes = [
         #   '/home/kfzhao/data/ECJ_instances/national'
         #  ,'/home/kfzhao/data/ECJ_instances/rue'
@@ -19,44 +23,78 @@ pathes = [
         ]
 
 filename = '/home/kfzhao/data/ECJ_instances/tsplib/att532.tsp'
-def load_tsp_instance(filename):
-    problem = tsplib95.load_problem(filename)
-    N = problem.dimension
+def load_tsp_instance(filename, outputs = ('x', 'adj', 'edges'), max_bytes = 1 << 28):
+    """
+    normalize the tsp instance and write the requested representations once to <instance>_norm/:
+    x.npy: (N, 2) float32 normalized coordinates, always written
+    adj.npy: (N, N) float32 distance matrix
+    edge_index.npy, edge_attr.npy ('edges'): complete graph, int32 (2, E) and float32 (E, ),
+                                            the non-zero entries of adj in row-major order
+    the distances are computed in row blocks of at most max_bytes and written straight into the
+    memory-mapped .npy files, read them back with load_norm_instance
+    """
+    x = read_coordinates(filename)
+    N = x.shape[0]
 
     print("problem size:", N)
-    # skip large graph with >10000 nodes
-    #if N > 10000 or problem.edge_weight_type != 'EUC_2D':
-    #    return
+    x = coordinate_normalize(x)
 
+    path = os.path.splitext(filename)[0] + '_norm'
+    tmp_path = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(filename)))
+    np.save(os.path.join(tmp_path, 'x.npy'), x)
+    if 'adj' in outputs:
+        adj = open_memmap(os.path.join(tmp_path, 'adj.npy'), mode='w+', dtype=np.float32, shape=(N, N))
+        distance_matrix(x, adj, max_bytes)
+        adj.flush()
+        del adj
+    if 'edges' in outputs:
+        num_edges = num_complete_edges(x)
+        edge_index = open_memmap(os.path.join(tmp_path, 'edge_index.npy'), mode='w+', dtype=np.int32,
+                                 shape=(2, num_edges))
+        edge_attr = open_memmap(os.path.join(tmp_path, 'edge_attr.npy'), mode='w+', dtype=np.float32,
+                                shape=(num_edges, ))
+        complete_graph(x, edge_index, edge_attr, max_bytes)
+        edge_index.flush()
+        edge_attr.flush()
+        del edge_index, edge_attr
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+    print(filename + " saved.")
+
+
+def load_norm_instance(filename, mmap_mode = 'r'):
     """
-    G = problem.get_graph()
-#    print(G.number_of_nodes())
-    #print(G.nodes)
-#    print(G.number_of_edges())
-    #print(G.edges)
+    the representations written by load_tsp_instance as a dictionary of (memory-mapped) arrays,
+    or the dictionary of an old <instance>_norm.pickle
     """
+    path = os.path.splitext(filename)[0] + '_norm'
+    if not os.path.isdir(path):
+        with open(path + '.pickle', 'rb') as in_file:
+            return pickle.load(in_file)
+    return {os.path.splitext(name)[0]: np.load(os.path.join(path, name), mmap_mode=mmap_mode)
+            for name in os.listdir(path) if name.endswith('.npy')}
 
-    mat = np.zeros(shape=(N, N), dtype= np.float32)
-    x = np.zeros(shape=(N, 2), dtype= np.float32) # node coordinate
 
+def save_tsp_graph(filename, method = 'knn', k = 8):
+    """
+    sparse kNN / Delaunay graph of the tsp instance for MPNN and CGCNN instead of the complete graph,
+    saved to <instance>_<method>.pickle with the keys x, edge_index (int32) and edge_attr (float32)
+    """
+    x = coordinate_normalize(read_coordinates(filename))
+    edge_index, edge_attr = build_graph(x, method, k)
+    instance = {'x': x, 'edge_index': edge_index, 'edge_attr': edge_attr}
+    with open(os.path.splitext(filename)[0] + '_{}.pickle'.format(method), 'wb') as out_file:
+        pickle.dump(obj = instance, file = out_file, protocol= 3)
+    print(filename + " saved.")
 
-    for i in range(N):
-        x[i][0], x[i][1] = problem.node_coords[i + 1][0], problem.node_coords[i + 1][1]
-    x = coordinate_normalize(x)
-    for i in range(N):
-        for j in range(i + 1, N):
-            #mat[i, j] = mat[j, i] = problem.wfunc(i + 1, j + 1)
-            mat[i, j] = mat[j, i] = euclidean(x[i], x[j])
-
-    A = sp.csr_matrix(mat)
-    edge_index, edge_attr = from_scipy_sparse_matrix(A)
-    edge_index, edge_attr = edge_index.numpy(), edge_attr.numpy()
 
-    instance = {'x': x, 'edge_index': edge_index, 'edge_attr': edge_attr,  'adj': A.todense()}
-    with open(os.path.splitext(filename)[0] + '_norm.pickle', 'wb') as out_file:
-        pickle.dump(obj = instance, file = out_file, protocol= 3)
-        print(filename + " saved.")
-        out_file.close()
+def load_tsp_graph(filename, method = 'knn'):
+    """
+    the dictionary (x, edge_index, edge_attr) of the <instance>_<method>.pickle of save_tsp_graph
+    """
+    with open(os.path.splitext(filename)[0] + '_{}.pickle'.format(method), 'rb') as in_file:
+        return pickle.load(in_file)
 
 
 def coordinate_normalize(x):
@@ -70,94 +108,69 @@ def coordinate_normalize(x):
 
 
 def matrix_reorder(filename):
-    in_file = open(os.path.splitext(filename)[0] + '_norm.pickle', 'rb')
-    data = pickle.load(in_file)
+    data = load_norm_instance(filename)
     x = data['x']
     A = data['adj']
-    N = A.shape[0]
-    pca = PCA(n_components=1)
-    x = pca.fit_transform(x).squeeze()
-    temp = x.argsort()
-    ranks = np.empty_like(temp)
-    ranks[temp] = np.arange(len(x))
-    for i in range(N):
-        A[:, i] = A[ranks, i]
-    for i in range(N):
-        A[i, :] = A[i, ranks]
+    # the rows and columns are indexed by the rank of each city, as the former per-column loops did
+    ranks = inverse_permutation(spatial_order(x, 'pca'))
+    A = permute_matrix(A, ranks)
     print(A.shape)
 
 
 def hilbert_matrix_reorder(filename):
-    in_file = open(os.path.splitext(filename)[0] + '_norm.pickle', 'rb')
-    data = pickle.load(in_file)
+    data = load_norm_instance(filename)
     x = data['x']
     A = data['adj']
-    N = A.shape[0]
     x_norm = x * 1000
     x_norm = x_norm.astype(int)
-    hilbert_curve = HilbertCurve(10,  2)
-    temp = np.zeros(shape=( N ))
-    for i in range( N ):
-        temp[i] = hilbert_curve.distance_from_coordinates([x_norm[i][0], x_norm[i][1]])
-
-    temp = temp.argsort()
-    ranks = np.empty_like(temp)
-    ranks[temp] = np.arange(len(temp))
-    for i in range(N):
-        A[:, i] = A[ranks, i]
-    for i in range(N):
-        A[i, :] = A[i, ranks]
+    # order 10 curve on the (x * 1000) grid, the keys of HilbertCurve(10, 2)
+    temp = np.argsort(hilbert_index(x_norm, p = 10), kind='stable')
+    ranks = inverse_permutation(temp)
+    A = permute_matrix(A, ranks)
     print(A.shape)
 
+def rot90_images(x, num_grid = 256):
+    """
+    (4, num_grid, num_grid) density image of x rotated by 90, 180, 270 and 360 degrees
+    """
+    image = coordinate_to_grid_image(x = x, num_grid= num_grid)
+    return np.stack([np.rot90(image, direction + 1) for direction in range(4)])
+
+
+def flip_images(x, num_grid = 256):
+    """
+    (2, num_grid, num_grid) density image of x flipped along axis 0 and axis 1
+    """
+    image = coordinate_to_grid_image(x = x, num_grid= num_grid)
+    return np.stack([np.flip(image, axis= 0), np.flip(image, axis= 1)])
+
+
+ROTATE_ANGLES = [45, 90, 135, 180, 225, 270, 315, 360]
+
+
+def rotate_images(x, num_grid = 256, angles = ROTATE_ANGLES):
+    """
+    (# angles, num_grid, num_grid) density images of x rotated on the original coordinates and normalized
+    """
+    return np.stack([coordinate_to_grid_image(x = coordinate_normalize(coordinate_rotate(x, angle)),
+                                              num_grid=num_grid) for angle in angles])
+
+
 def savetoTSPImage(filename, num_grid = 256):
-    in_file = open(os.path.splitext(filename)[0] + '_norm.pickle', 'rb')
-    data = pickle.load(in_file)
+    data = load_norm_instance(filename)
     x = data['x']
-    image = coordinate_to_grid_image(x = x, num_grid= num_grid)
-    for direction in range(4):
-        image = np.rot90(image)
+    for direction, image in enumerate(rot90_images(x, num_grid)):
         instance = {'adj': image}
         out_file_dir = os.path.splitext(filename)[0] + '_{0}_{1}_image.pickle'.format(num_grid, direction)
-        with open(out_file_dir, 'wb') as out_file:
-            pickle.dump(obj=instance, file=out_file, protocol=3)
-            out_file.close()
+        dump(instance, out_file_dir)
 
 def tsp_image_rotate_and_flip(filename, num_grid = 256):
-    in_file = open(os.path.splitext(filename)[0] + '_norm.pickle', 'rb')
-    data = pickle.load(in_file)
+    data = load_norm_instance(filename)
     x = data['x']
-    image = coordinate_to_grid_image(x = x, num_grid= num_grid)
-
-    v_image = sparse.csr_matrix(np.flip(image, axis= 0))
-    instance = {'adj': v_image}
-    out_file_dir = os.path.splitext(filename)[0] + '_{0}_flip0_image.pickle'.format(num_grid)
-    with open(out_file_dir, 'wb') as out_file:
-        pickle.dump(obj=instance, file=out_file, protocol=3)
-        out_file.close()
-
-    h_image = sparse.csr_matrix(np.flip(image, axis=1))
-    instance = {'adj': h_image}
-    out_file_dir = os.path.splitext(filename)[0] + '_{0}_flip1_image.pickle'.format(num_grid)
-    with open(out_file_dir, 'wb') as out_file:
-        pickle.dump(obj=instance, file=out_file, protocol=3)
-        out_file.close()
-
-    '''
-    for direction in range(4):
-        image = np.rot90(image)
-        instance = {'adj': np.flip(image, axis=0)}
-        out_file_dir = os.path.splitext(filename)[0] + '_{0}_{1}_flip0_image.pickle'.format(num_grid, direction)
-        with open(out_file_dir, 'wb') as out_file:
-            pickle.dump(obj=instance, file=out_file, protocol=3)
-            out_file.close()
-
-        instance = {'adj': np.flip(image, axis=1)}
-        out_file_dir = os.path.splitext(filename)[0] + '_{0}_{1}_flip1_image.pickle'.format(num_grid, direction)
-        with open(out_file_dir, 'wb') as out_file:
-            pickle.dump(obj=instance, file=out_file, protocol=3)
-            out_file.close()
-    '''
-
+    for axis, image in enumerate(flip_images(x, num_grid)):
+        instance = {'adj': sparse.csr_matrix(image)}
+        out_file_dir = os.path.splitext(filename)[0] + '_{0}_flip{1}_image.pickle'.format(num_grid, axis)
+        dump(instance, out_file_dir)
 
 def coordinate_rotate(x, angle):
     new_x = np.zeros(shape= x.shape)
@@ -167,12 +180,7 @@ def coordinate_rotate(x, angle):
     return new_x
 
 def coordinate_to_grid_image(x, num_grid = 256):
-    image = np.zeros((num_grid, num_grid), dtype=np.float32)
-    for i in range(x.shape[0]):
-        idx_x = int(x[i][0] * num_grid) - 1
-        idx_y = int(x[i][1] * num_grid) - 1
-        image[idx_x][idx_y] = image[idx_x][idx_y] + 1.0
-    return image
+    return density_image(x, num_grid)
 
 
 def tsp_image_rotate(filename, num_grid = 256):
@@ -180,17 +188,11 @@ def tsp_image_rotate(filename, num_grid = 256):
     data = pickle.load(in_file)
     x = data['x']
 
-    for angle in [45, 90, 135, 180, 225, 270, 315, 360]:
-        new_x = coordinate_rotate(x, angle)
-        # rotate on the original coordinate and normalize
-        new_x = coordinate_normalize(new_x)
-        image = coordinate_to_grid_image(x = new_x, num_grid=num_grid)
+    for angle, image in zip(ROTATE_ANGLES, rotate_images(x, num_grid)):
         image = sparse.csr_matrix(image)
         instance = {'adj': image}
         out_file_dir = os.path.splitext(filename)[0] + '_{0}_{1}_image.pickle'.format(num_grid, angle)
-        with open(out_file_dir, 'wb') as out_file:
-            pickle.dump(obj=instance, file=out_file, protocol=3)
-            out_file.close()
+        dump(instance, out_file_dir)
 
 
 
@@ -246,11 +248,10 @@ def input_test(path = '/home/kfzhao/data/ECJ_instances/'):
 
 def visual_instance(filename):
     in_file_dir = os.path.splitext(filename)[0] + '_{0}_{1}_image.pickle'.format(256, 360)
-    with open(in_file_dir, 'rb') as in_file:
-        data = pickle.load(in_file)
-        A = data['adj']
-        A = A.todense()
-        image_visualization(A)
+    data = load(in_file_dir)
+    A = data['adj']
+    A = A.todense()
+    image_visualization(A)
 
 
 def image_visualization(mat):
@@ -258,71 +259,23 @@ def image_visualization(mat):
     plt.show()
 
 
-def process_one_instance(data):
-    instance_id = data[0][0]
-    dataset = instance_id.split('_')[0].strip()
-    """
-    if dataset == 'rue':
-        return None, None, None
-    """
-    best_runtime = 36000
-    best_algorithm = 'all'
-    algorithm_to_result = {}
-    for i in range(50):
-        ins_id, repeat, algorithm, runtime, runstatus = \
-        data[i][0], data[i][1], data[i][2], data[i][3], data[4]
-        if ins_id != instance_id:
-            return None, None, None
-        if algorithm not in algorithm_to_result.keys():
-            algorithm_to_result[algorithm] = list([runtime])
-        else:
-            algorithm_to_result[algorithm].append(runtime)
-
-    algorithm_to_median = {} # algorithm-> median runtime
-    for key, value in algorithm_to_result.items():
-        value.sort()
-        algorithm_to_median[key] = (value[4] + value[5]) / 2.0
-        if value[5] < 3600:
-            if (value[4] + value[5]) / 2.0 < best_runtime:
-                best_runtime = (value[4] + value[5]) / 2.0 # median of the test performance
-                best_algorithm = key
-        else:
-            algorithm_to_median[key] = 36000.0
-    return instance_id, best_algorithm, algorithm_to_median
-
 def load_labels(filename = '/home/kfzhao/data/ECJ_instances/algorithm_runs.arff.txt'):
-
-    file = open(filename, 'r')
-    data = []
-    labels = {}
-    for line in file:
-        if line.strip().startswith('@') or line.strip() == '':
-            continue
-        line = line.strip().split(',')
-        ins_id, repeat, algorithm, runtime, runstatus = \
-        str(line[0]), int(line[1]), str(line[2]), float(line[3]), str(line[4])
-        data.append((ins_id, repeat, algorithm, runtime, runstatus))
-    file.close()
+    perf = load_performance(filename)
+    result = aggregate_performance(perf, t_max = 3600.0, penalize_factor = 10, ok_status = None)
+    labels = to_label_dict(result)
     label_file = open('./tsp_labels.txt', 'w')
-    num_instances = 0
-    sbs_run_time = 0
-    best_run_time = 0
-    for i in range(int(len(data) / 50)):
-        instance_id, best_algorithm, algorithm_to_median = process_one_instance(data[i * 50: i * 50 + 50])
-        #print(instance_id, best_algorithm)
-        if instance_id is not None:
-            labels[instance_id] = (best_algorithm, algorithm_to_median)
-            num_instances += 1
-            sbs_run_time += algorithm_to_median['eax.restart']
-            best_run_time += algorithm_to_median[best_algorithm]
-            res = instance_id + ',' + best_algorithm
-            for key, values in algorithm_to_median.items():
-                res = res + ',' + key + ',' + str(values)
-            res = res + '\n'
-            label_file.write(res)
-    #print("num of record:", len(data))
+    for instance_id, (best_algorithm, algorithm_to_median) in labels.items():
+        res = instance_id + ',' + best_algorithm
+        for key, values in algorithm_to_median.items():
+            res = res + ',' + key + ',' + str(values)
+        res = res + '\n'
+        label_file.write(res)
+    #print("num of record:", perf.runtime.size)
     #print("num of labels:", len(labels))
     label_file.close()
+    num_instances = len(labels)
+    sbs_run_time = result['par'][:, result['algorithm_names'].index('eax.restart')].sum()
+    best_run_time = result['par'].min(axis = 1).sum()
     print("average sbs run time={}".format(sbs_run_time / num_instances))
     print("average best run time={}".format(best_run_time / num_instances))
     return labels